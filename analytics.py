@@ -0,0 +1,196 @@
+"""
+教師分析
+
+每個數字的練習次數、通過次數、分數總和，以及「唸成了什麼」的混淆次數，
+存在練習紀錄資料庫的 number_stats 與 confusions 兩張表裡。
+練習紀錄每寫入一批（attempt_log），就在同一個交易裡把這批的加總
+累加上去；清掉過期紀錄時也從加總裡扣掉，所以分析頁不必重新掃描全部歷史。
+
+分析頁讀出來的加總轉成 NumPy 陣列，通過率、平均分數與排序都是向量化計算，
+花的時間只跟數字的個數有關，跟紀錄有幾筆無關。
+"""
+import os
+import sqlite3
+import time
+from collections import Counter
+
+import numpy as np
+
+from scoring import normalize_text
+
+MAX_HEARD_LENGTH = 40
+DAY_SECONDS = 24 * 60 * 60
+
+
+def heard_as(recognized_number, transcript):
+    """錯誤時「聽成了什麼」：有對應到數字就用數字，否則用正規化後的辨識文字"""
+    if recognized_number is not None:
+        return str(recognized_number)
+    if transcript:
+        return normalize_text(transcript)[:MAX_HEARD_LENGTH] or None
+    return None
+
+
+def _summarize(rows):
+    """rows 是 (number, is_correct, score, recognized_number, transcript)，回傳兩張表的增量"""
+    totals = {}
+    confusions = Counter()
+    for number, is_correct, score, recognized_number, transcript in rows:
+        if number is None:
+            continue
+        attempts, passes, score_sum, scored = totals.get(number, (0, 0, 0.0, 0))
+        totals[number] = (
+            attempts + 1,
+            passes + bool(is_correct),
+            score_sum + (score or 0.0),
+            scored + (score is not None),
+        )
+        if not is_correct:
+            heard = heard_as(recognized_number, transcript)
+            if heard is not None and heard != str(number):
+                confusions[number, heard] += 1
+    return totals, confusions
+
+
+def update_aggregates(conn, rows, sign=1):
+    """
+    把一批紀錄累加進加總表（sign=-1 時扣掉）；
+    呼叫者負責交易，跟寫入或刪除紀錄放在同一個交易裡
+    """
+    totals, confusions = _summarize(rows)
+    conn.executemany(
+        """
+        INSERT INTO number_stats (number, attempts, passes, score_sum, scored)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (number) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            passes = passes + excluded.passes,
+            score_sum = score_sum + excluded.score_sum,
+            scored = scored + excluded.scored
+        """,
+        [
+            (number, sign * attempts, sign * passes, sign * score_sum, sign * scored)
+            for number, (attempts, passes, score_sum, scored) in totals.items()
+        ],
+    )
+    conn.executemany(
+        """
+        INSERT INTO confusions (number, heard, count) VALUES (?, ?, ?)
+        ON CONFLICT (number, heard) DO UPDATE SET count = count + excluded.count
+        """,
+        [(number, heard, sign * count) for (number, heard), count in confusions.items()],
+    )
+    if sign < 0:
+        conn.execute("DELETE FROM number_stats WHERE attempts <= 0")
+        conn.execute("DELETE FROM confusions WHERE count <= 0")
+
+
+# =========================
+# 分析頁用的讀取與計算
+# =========================
+def _connect_readonly(path):
+    if not path or not os.path.exists(path):
+        return None
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=10)
+
+
+def load_number_stats(path, start=None, end=None):
+    """
+    讀出每個數字的加總並計算通過率與平均分數，回傳欄位都是 NumPy 陣列的 dict
+    （依數字排序）；沒有資料時每個陣列都是空的
+    """
+    query = "SELECT number, attempts, passes, score_sum, scored FROM number_stats"
+    params = ()
+    if start is not None and end is not None:
+        query += " WHERE number BETWEEN ? AND ?"
+        params = (start, end)
+    conn = _connect_readonly(path)
+    rows = []
+    if conn is not None:
+        try:
+            rows = conn.execute(query + " ORDER BY number", params).fetchall()
+        except sqlite3.OperationalError:
+            rows = []  # 還沒有任何紀錄寫進來（資料表還沒建立）
+        finally:
+            conn.close()
+
+    table = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    numbers = table[:, 0].astype(np.int64)
+    attempts = table[:, 1]
+    passes = table[:, 2]
+    score_sum = table[:, 3]
+    scored = table[:, 4]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pass_rate = np.where(attempts > 0, passes / attempts, np.nan)
+        mean_score = np.where(scored > 0, score_sum / scored, np.nan)
+    return {
+        "number": numbers,
+        "attempts": attempts.astype(np.int64),
+        "passes": passes.astype(np.int64),
+        "pass_rate": pass_rate,
+        "mean_score": mean_score,
+    }
+
+
+def hardest_numbers(stats, min_attempts=5, limit=10):
+    """練習次數至少 min_attempts 的數字裡，通過率最低的幾個（同分時平均分數低的優先）"""
+    eligible = np.flatnonzero(stats["attempts"] >= min_attempts)
+    if eligible.size == 0:
+        return eligible
+    # lexsort 以最後一個鍵為主鍵
+    order = np.lexsort((stats["mean_score"][eligible], stats["pass_rate"][eligible]))
+    return eligible[order[:limit]]
+
+
+def load_confusions(path, number=None, limit=20):
+    """最常見的混淆：[(數字, 聽成, 次數)]，依次數排序"""
+    query = "SELECT number, heard, count FROM confusions"
+    params = ()
+    if number is not None:
+        query += " WHERE number = ?"
+        params = (number,)
+    conn = _connect_readonly(path)
+    if conn is None:
+        return []
+    try:
+        return conn.execute(query + " ORDER BY count DESC, number LIMIT ?", params + (limit,)).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def daily_pass_rate(path, days=30, now=None):
+    """
+    最近 days 天每天的練習次數與通過率；回傳 (每天開始的時間戳, 次數, 通過率)。
+    分日加總交給 SQLite（只回傳 days 列），再用 NumPy 填進每天的陣列
+    """
+    now = time.time() if now is None else now
+    # 以本地時間的午夜分日
+    today = now - (now + time.localtime(now).tm_gmtoff) % DAY_SECONDS
+    since = today - (days - 1) * DAY_SECONDS
+    conn = _connect_readonly(path)
+    rows = []
+    if conn is not None:
+        try:
+            rows = conn.execute(
+                """
+                SELECT CAST((created_at - ?) / ? AS INTEGER) AS day, COUNT(*), SUM(is_correct)
+                FROM attempts WHERE created_at >= ? GROUP BY day
+                """,
+                (since, DAY_SECONDS, since),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+
+    table = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    table = table[table[:, 0] < days]
+    attempts = np.zeros(days, dtype=np.int64)
+    passes = np.zeros(days, dtype=np.int64)
+    attempts[table[:, 0]] = table[:, 1]
+    passes[table[:, 0]] = table[:, 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pass_rate = np.where(attempts > 0, passes / attempts, np.nan)
+    return since + np.arange(days) * DAY_SECONDS, attempts, pass_rate
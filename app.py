@@ -1,16 +1,48 @@
 import streamlit as st
-from gtts import gTTS
+import importlib
 import os
-import tempfile
-import speech_recognition as sr
-from num2words import num2words
+import queue
 import random
-from rapidfuzz import fuzz
-import re
 import time
+from collections import deque
+from functools import lru_cache
+from streamlit.errors import StreamlitAPIException
+from audio_cache import AudioCache, SharedAudioCache
+from cache_backends import shared_backend
+from number_words import get_number_word, number_vocabulary
+from audio_store import audio_store
+from outbound import OutboundError
+from tts_engine import render_gtts
+from tts_pack import load_pack
+from recognizers import BACKENDS, DEFAULT_BACKEND, RECOGNITION_TIMEOUT, get_backend, latency_stats
+from jobs import JobPool, JobPoolFull
+from metrics import metrics
+from attempt_log import attempt_log
+from profiling import profile_rerun
+from sessions import current_session, registry as session_registry
+from scheduler import WeaknessScheduler
 
 st.set_page_config(page_title="英文數字跟讀練習", layout="wide", initial_sidebar_state="expanded")
 
+# Session 生命週期：回報這個 session 還在用；閒置太久被清掉的分頁會從頭開始
+session_id, session_view = current_session()
+if session_registry.touch(session_id, session_view) or st.session_state.pop("session_evicted", False):
+    st.toast("😴 休息太久了，我們重新開始吧！")
+
+# 效能分析：網址加上 ?profile=1 或打開側邊欄的管理開關，整次重跑都會被取樣
+PROFILE_REPORTS_KEPT = 5
+if "profile_reports" not in st.session_state:
+    # 只留最近幾份報告（畫面只顯示最後一份），開著分析也不會一直長大
+    st.session_state.profile_reports = deque(maxlen=PROFILE_REPORTS_KEPT)
+if st.query_params.get("profile") == "1" or st.session_state.get("profile_reruns"):
+    profile_rerun(
+        st.session_state.profile_reports,
+        tag=st.session_state.get("phase", "ready"),
+        on_done=lambda report: session_registry.add_files(
+            session_id, report["report_path"], report["collapsed_path"]
+        ),
+    )
+
 # =========================
 # CSS 樣式 - 增加動畫效果
 # =========================
@@ -122,97 +154,91 @@ if "mode" not in st.session_state:
     st.session_state.mode = "跟讀模式"
 if "challenge_correct" not in st.session_state:
     st.session_state.challenge_correct = 0
-if "tts_cache" not in st.session_state:
-    st.session_state.tts_cache = {}
+if "practice_total" not in st.session_state:
+    st.session_state.practice_total = 0
+if "scheduler" not in st.session_state:
+    st.session_state.scheduler = None  # 闖關模式的出題順序，同一個範圍內一直沿用
 if "last_result" not in st.session_state:
     st.session_state.last_result = None
+if "last_latency" not in st.session_state:
+    st.session_state.last_latency = None
+if "last_alternatives" not in st.session_state:
+    st.session_state.last_alternatives = []
+if "last_number" not in st.session_state:
+    st.session_state.last_number = None
+if "last_preprocessing" not in st.session_state:
+    st.session_state.last_preprocessing = None
 if "auto_mode" not in st.session_state:
     st.session_state.auto_mode = False
+if "asr_job" not in st.session_state:
+    st.session_state.asr_job = None
+if "prefetch_jobs" not in st.session_state:
+    st.session_state.prefetch_jobs = {}  # 數字 -> 預先合成老師發音的 Job
 if "phase" not in st.session_state:
-    st.session_state.phase = "ready"  # ready, playing, waiting, recording, processing
+    st.session_state.phase = "ready"  # ready, played, processing, result
 
 # =========================
 # 工具函數
 # =========================
-def normalize_text(text):
-    text = text.lower()
-    text = re.sub(r"[-]", " ", text)
-    text = re.sub(r"[^a-z0-9 ]", "", text)
-    return text.strip()
-
-def calculate_score(target, result, tolerance_level="中等"):
-    target = normalize_text(target)
-    result = normalize_text(result)
-    
-    child_pronunciation_map = {
-        "three": ["tree", "free", "sree"],
-        "thirteen": ["thirty", "thurteen", "firteen"],
-        "thirty": ["thirteen", "thirsty", "turty"],
-        "five": ["fibe", "fife"],
-        "seven": ["seben", "sebun"],
-        "eleven": ["eleben", "levin"],
-        "twelve": ["twelb", "twelf"],
-        "twenty": ["twenny", "twunty"],
-        "fifty": ["fity", "fifthy"],
-        "sixty": ["sickty", "sikty"],
-        "seventy": ["sebenty", "sevunty"],
-        "eighty": ["eity", "eitty"],
-        "ninety": ["ninty", "ninity"],
-    }
-    
-    if tolerance_level == "寬鬆":
-        target_words = target.split()
-        result_words = result.split()
-        
-        for target_word in target_words:
-            if target_word in result_words:
-                return 100
-            if target_word in child_pronunciation_map:
-                for similar in child_pronunciation_map[target_word]:
-                    if similar in result:
-                        return 95
-        
-        matches = sum(1 for word in target_words if word in result)
-        if matches > 0:
-            return 80 + (matches * 5)
-        
-        base_score = fuzz.ratio(target, result)
-        return min(100, base_score + 15)
-        
-    elif tolerance_level == "中等":
-        target_words = target.split()
-        matches = sum(1 for word in target_words if word in result)
-        
-        tolerance_bonus = 0
-        for target_word in target_words:
-            if target_word in child_pronunciation_map:
-                for similar in child_pronunciation_map[target_word]:
-                    if similar in result:
-                        tolerance_bonus += 10
-                        break
-        
-        base_score = fuzz.ratio(target, result)
-        bonus = matches * 10
-        return min(100, base_score + bonus + tolerance_bonus)
-        
-    else:
-        target_words = target.split()
-        matches = sum(1 for word in target_words if word in result)
-        base_score = fuzz.ratio(target, result)
-        bonus = matches * 5
-        return min(100, base_score + bonus)
+@st.cache_resource
+def get_audio_cache():
+    """所有 session 共用的 TTS 音檔快取；設定了 CACHE_BACKEND 時改放在那個共用儲存"""
+    backend = shared_backend()
+    return SharedAudioCache(backend) if backend is not None else AudioCache()
 
-def get_number_word(number):
-    return num2words(number).replace("-", " ")
+@st.cache_resource
+def reap_orphaned_files():
+    """伺服器啟動後第一次執行時，清掉上次留下的暫存檔（每個行程只做一次）"""
+    return session_registry.reap_orphaned_files()
 
-def generate_tts(number):
-    if number not in st.session_state.tts_cache:
+@st.cache_resource
+def get_tts_pack():
+    """啟動時以 mmap 開啟預錄音檔包（沒有建立過就是 None）"""
+    return load_pack()
+
+def load_teacher_audio(number, pack, cache):
+    """老師發音：音檔包 → 共用快取 → gTTS。不碰 Streamlit 狀態，背景預先合成也用這個"""
+    with metrics.timed("generate_tts") as labels:
         word = get_number_word(number)
-        tts = gTTS(text=word, lang="en")
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        tts.save(tmp_file.name)
-        st.session_state.tts_cache[number] = tmp_file.name
-    return st.session_state.tts_cache[number]
+        if pack is not None:
+            audio = pack.get(number, word)
+            if audio is not None:
+                labels["source"] = "pack"
+                metrics.inc("tts_lookups", source="pack")
+                return audio
+        audio = cache.get(word, "en", "gtts")
+        if audio is not None:
+            labels["source"] = "cache"
+            metrics.inc("tts_lookups", source="cache")
+            return audio
+        labels["source"] = "gtts"
+        metrics.inc("tts_lookups", source="gtts")
+        try:
+            audio = render_gtts(word)
+        except Exception:
+            metrics.inc("tts_errors")
+            raise
+        cache.put(word, "en", "gtts", audio)
+        return audio
+
+def generate_tts(number):
+    return load_teacher_audio(number, get_tts_pack(), get_audio_cache())
+
+def play_teacher_audio(number):
+    """播放老師發音；gTTS 連不上又沒有快取時只顯示提示，不讓整頁出錯"""
+    try:
+        audio = generate_tts(number)
+    except OutboundError:
+        st.warning("🔇 暫時拿不到老師發音（網路不穩），可以先看著單字唸唸看")
+        return
+    if audio_store.mounted:
+        # 固定網址加上長效快取標頭，重播時瀏覽器直接用自己快取的音檔
+        st.markdown(
+            f"<audio src='{audio_store.url(audio_store.put(audio))}' controls autoplay style='width: 100%'></audio>",
+            unsafe_allow_html=True,
+        )
+    else:
+        st.audio(audio, format="audio/mp3", autoplay=True)
 
 def get_encouragement():
     """隨機返回鼓勵語"""
@@ -242,47 +268,385 @@ def get_success_message():
     ]
     return random.choice(messages)
 
-def process_audio(audio_bytes, target_word, score_good, score_ok, tolerance_level):
-    tmp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-    tmp_audio.write(audio_bytes)
-    tmp_audio.close()
+RECOGNITION_POLL_SECONDS = 0.3
+CHALLENGE_LENGTH = 10
+MAX_NUMBER = 10 ** 9
+# 目前這題之後再預先準備幾題的老師發音
+PREFETCH_AHEAD = int(os.environ.get("TTS_PREFETCH_AHEAD", 3))
+CLICK_CAPTURE = "點擊錄音"
+STREAMING_CAPTURE = "自動偵測（串流）"
+RTC_CONFIGURATION = {"iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]}
+
+@st.cache_resource
+def get_recognition_pool():
+    """所有 session 共用、有上限的辨識工作池"""
+    return JobPool(
+        max_workers=int(os.environ.get("ASR_WORKERS", 4)),
+        max_pending=int(os.environ.get("ASR_MAX_PENDING", 32)),
+        name="asr",
+    )
+
+@st.cache_resource
+def get_prefetch_pool():
+    """所有 session 共用的預先合成工作池；跟辨識分開，預先合成再多也不會卡住辨識"""
+    return JobPool(
+        max_workers=int(os.environ.get("TTS_PREFETCH_WORKERS", 2)),
+        max_pending=int(os.environ.get("TTS_PREFETCH_MAX_PENDING", 64)),
+        name="prefetch",
+    )
+
+def upcoming_numbers():
+    """目前這題加上接下來 PREFETCH_AHEAD 題；闖關模式的下一題還沒出，就用排隊中的新數字"""
+    index = st.session_state.current_index
+    if st.session_state.scheduler is not None and st.session_state.mode == "闖關模式":
+        return list(st.session_state.numbers_list[index:index + 1]) + st.session_state.scheduler.upcoming(PREFETCH_AHEAD)
+    return list(st.session_state.numbers_list[index:index + 1 + PREFETCH_AHEAD])
+
+def prefetch_upcoming():
+    """小朋友還在目前這題時，先在背景準備接下來幾題的老師發音"""
+    jobs = st.session_state.prefetch_jobs
+    wanted = upcoming_numbers()
+    for number, job in list(jobs.items()):
+        if job.done() or number not in wanted:
+            # 已經做完的不用再追蹤；跳過的題目還沒開始就取消
+            job.cancel()
+            del jobs[number]
+    
+    pack, cache = get_tts_pack(), get_audio_cache()
+    for number in wanted:
+        if number in jobs:
+            continue
+        word = get_number_word(number)
+        if (pack is not None and pack.has(number, word)) or cache.contains(word, "en", "gtts"):
+            continue
+        try:
+            # 小朋友剛好按下播放時，gTTS 的請求會跟這裡合併成同一個（outbound 的 single-flight）
+            jobs[number] = get_prefetch_pool().submit(load_teacher_audio, number, pack, cache)
+        except JobPoolFull:
+            break
+
+def cancel_prefetch():
+    """重新開始練習時，取消還沒開始的預先合成"""
+    for job in st.session_state.prefetch_jobs.values():
+        job.cancel()
+    st.session_state.prefetch_jobs = {}
+
+def apply_outcome(outcome):
+    st.session_state.feedback = outcome["feedback"]
+    st.session_state.last_score = outcome["score"]
+    st.session_state.last_result = outcome["result"]
+    st.session_state.last_latency = (outcome["backend"], outcome["latency_ms"])
+    st.session_state.last_alternatives = outcome["alternatives"]
+    st.session_state.last_number = outcome["number"]
+    st.session_state.last_preprocessing = outcome["preprocessing"]
+    st.session_state.phase = "result"
     
-    recognizer = sr.Recognizer()
+    if outcome["is_correct"]:
+        st.session_state.challenge_correct += 1
+    
+    target_number = st.session_state.numbers_list[st.session_state.current_index]
+    if st.session_state.scheduler is not None:
+        st.session_state.scheduler.record(target_number, outcome["score"])
+    attempt_log.record(
+        session_id=session_id,
+        mode=st.session_state.mode,
+        number=target_number,
+        target_word=get_number_word(target_number),
+        transcript=outcome["result"],
+        recognized_number=outcome["number"],
+        score=outcome["score"],
+        is_correct=outcome["is_correct"],
+        feedback=outcome["feedback"],
+        tolerance_level=tolerance_level,
+        backend=outcome["backend"],
+        latency_ms=outcome["latency_ms"],
+    )
+
+def cancel_recognition():
+    """取消還在背景辨識的工作（例如小朋友按了「再試一次」）"""
+    if st.session_state.asr_job is not None:
+        st.session_state.asr_job.cancel()
+        st.session_state.asr_job = None
+
+def keep_session_alive():
+    """
+    fragment 重跑不會經過頁面最上面的 touch，這裡也回報一次；
+    已經被清掉的話（session_state 是空的）整頁重跑，從頭初始化
+    """
+    if session_registry.touch(session_id, session_view) or "phase" not in st.session_state:
+        st.session_state.session_evicted = True
+        st.rerun()
+
+def rerun_practice():
+    """練習區自己重跑時只重跑練習區；整頁執行中就整頁重跑"""
     try:
-        with sr.AudioFile(tmp_audio.name) as source:
-            audio = recognizer.record(source)
-            result = recognizer.recognize_google(audio, language="en-US")
-            
-            score = calculate_score(target_word, result, tolerance_level)
-            
-            if score >= score_good:
-                feedback = "correct"
-                is_correct = True
-            elif score >= score_ok:
-                feedback = "close"
-                is_correct = False
-            else:
-                feedback = "retry"
-                is_correct = False
-                
-            return feedback, score, is_correct, result
-            
-    except sr.UnknownValueError:
-        return "unclear", None, False, None
-    except sr.RequestError:
-        return "error", None, False, None
-    except Exception as e:
-        return "error", None, False, str(e)
-    finally:
-        os.unlink(tmp_audio.name)
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def play_teacher():
+    """「聽老師發音」按鈕：進入 played 階段，並在下一次畫面自動播放"""
+    st.session_state.play_teacher_audio = True
+    st.session_state.phase = "played"
+
+def next_challenge_number():
+    """闖關模式每次前進時才出下一題，才能參考前面幾題的結果"""
+    numbers = st.session_state.numbers_list
+    if (
+        st.session_state.mode == "闖關模式"
+        and len(numbers) <= st.session_state.current_index < st.session_state.practice_total
+    ):
+        numbers.append(st.session_state.scheduler.next_number(exclude=numbers[-1] if numbers else None))
+
+def reset_attempt(advance=False):
+    """「再試一次」／「下一個數字」按鈕：回到 ready 階段"""
+    if advance:
+        st.session_state.current_index += 1
+        next_challenge_number()
+    st.session_state.feedback = ""
+    st.session_state.last_score = None
+    st.session_state.last_result = None
+    cancel_recognition()
+    st.session_state.phase = "ready"
+
+@st.cache_resource
+def get_vocabulary(start, end):
+    """練習範圍的辨識詞彙，每個範圍只算一次"""
+    return number_vocabulary(start, end)
+
+@st.cache_resource
+def warm_up_recognition():
+    """第一次有小朋友在聽老師發音時，先在背景載入辨識與評分模組（numpy、rapidfuzz 等）"""
+    return get_recognition_pool().submit(importlib.import_module, "recognition")
+
+def start_recognition(recorded, target_word, target_number):
+    """把錄音交給背景工作池辨識，並切換到 processing 階段"""
+    from recognition import process_audio
+    
+    args = (
+        recorded,
+        target_word,
+        score_good,
+        score_ok,
+        tolerance_level,
+    )
+    kwargs = dict(
+        backend_name=asr_backend,
+        vocabulary=get_vocabulary(start_n, end_n),
+        target_number=target_number,
+        number_range=(start_n, end_n),
+        preprocess=preprocess_audio,
+    )
+    
+    cancel_recognition()
+    try:
+        # 辨識交給背景工作池，畫面在 processing 階段輪詢結果
+        st.session_state.asr_job = get_recognition_pool().submit(
+            process_audio, *args, timeout=RECOGNITION_TIMEOUT, **kwargs
+        )
+        st.session_state.phase = "processing"
+    except JobPoolFull:
+        # 工作池滿了就退回同步辨識，至少不會丟掉這次錄音
+        with st.spinner("🔍 AI 正在仔細聆聽你的發音..."):
+            apply_outcome(process_audio(*args, **kwargs))
+
+def capture_streaming(key, max_seconds):
+    """串流錄音：邊收音邊做 VAD，偵測到說完或錄滿就回傳 WAV 位元組"""
+    try:
+        from streamlit_webrtc import WebRtcMode, webrtc_streamer
+    except ImportError as e:
+        st.warning(f"串流錄音無法使用（{e}），請在左側改用點擊錄音")
+        return None
+    from audio_processing import EnergyVAD, frame_to_mono
+    
+    ctx = webrtc_streamer(
+        key=key,
+        mode=WebRtcMode.SENDONLY,
+        audio_receiver_size=1024,
+        rtc_configuration=RTC_CONFIGURATION,
+        media_stream_constraints={"audio": True, "video": False},
+    )
+    if not ctx.state.playing or ctx.audio_receiver is None:
+        return None
+    
+    vad = EnergyVAD(max_seconds=max_seconds)
+    status = st.empty()
+    while ctx.state.playing and not vad.ended:
+        try:
+            frames = ctx.audio_receiver.get_frames(timeout=1)
+        except queue.Empty:
+            continue
+        for frame in frames:
+            if vad.push(frame_to_mono(frame), frame.sample_rate):
+                break
+        
+        heard = "🗣️ 聽到你的聲音了" if vad.speech_started else "🎙️ 請開始唸"
+        status.markdown(
+            f"<div style='text-align: center; font-size: 22px;'>{heard}（{vad.seconds:.1f} / {max_seconds} 秒）</div>",
+            unsafe_allow_html=True
+        )
+    
+    if not vad.ended:
+        return None
+    return vad.wav_bytes()
+
+@st.fragment(run_every=RECOGNITION_POLL_SECONDS)
+def recognition_status():
+    """定期檢查背景辨識是否完成，完成後才重新執行整個頁面（側邊欄的延遲統計也要更新）"""
+    from recognition import empty_outcome
+    
+    keep_session_alive()
+    job = st.session_state.asr_job
+    if job is None:
+        st.session_state.phase = "ready"
+        st.rerun()
+    
+    if job.done():
+        try:
+            outcome = job.result()
+        except Exception as e:
+            outcome = empty_outcome(asr_backend)
+            outcome["result"] = str(e)
+        st.session_state.asr_job = None
+        apply_outcome(outcome)
+        st.rerun()
+    
+    if job.expired():
+        cancel_recognition()
+        apply_outcome(empty_outcome(asr_backend))
+        st.rerun()
+    
+    st.markdown(f"""
+    <div style='text-align: center; font-size: 24px; color: #1976d2; margin: 20px 0;'>
+        🔍 AI 正在仔細聆聽你的發音...（{job.elapsed():.1f} 秒）
+    </div>
+    """, unsafe_allow_html=True)
+
+# =========================
+# 畫面片段（固定的 HTML 只組一次）
+# =========================
+READY_HINT_MARKUP = """
+<div style='text-align: center; margin: 30px 0; padding: 20px; background: #e3f2fd; border-radius: 10px;'>
+    <div style='font-size: 24px; color: #1976d2;'>
+        👆 點擊按鈕聽老師怎麼唸
+    </div>
+</div>
+"""
+
+YOUR_TURN_MARKUP = """
+<div class='blink-text' style='margin: 30px 0;'>
+    🎙️ 換你練習囉！
+</div>
+"""
+
+RECORD_STEP_MARKUP = """
+<div style='padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+            border-radius: 15px; margin: 20px 0;'>
+    <div style='text-align: center; color: white; font-size: 24px; font-weight: bold; margin-bottom: 15px;'>
+        🎤 第二步：錄下你的發音
+    </div>
+</div>
+"""
+
+STREAMING_TIPS_MARKUP = """
+<div style='text-align: center; margin: 20px 0; padding: 15px; background: #fff9c4; border-radius: 10px;'>
+    <div style='font-size: 18px; color: #f57f17;'>
+        💡 <b>操作提示：</b><br>
+        1️⃣ 點擊上方的 START（瀏覽器會詢問麥克風權限，請允許）<br>
+        2️⃣ 對著麥克風清楚地唸出數字<br>
+        3️⃣ 說完後停一下，系統會自動停止錄音<br>
+        4️⃣ 系統會自動判斷你的發音
+    </div>
+</div>
+"""
+
+CLICK_TIPS_MARKUP = """
+<div style='text-align: center; margin: 20px 0; padding: 15px; background: #fff9c4; border-radius: 10px;'>
+    <div style='font-size: 18px; color: #f57f17;'>
+        💡 <b>操作提示：</b><br>
+        1️⃣ 點擊上方的麥克風圖示（瀏覽器會詢問麥克風權限，請允許）<br>
+        2️⃣ 對著麥克風清楚地唸出數字<br>
+        3️⃣ 錄音完成後再點一次停止<br>
+        4️⃣ 系統會自動判斷你的發音
+    </div>
+</div>
+"""
+
+def progress_markup(mode, index, total):
+    # 不快取：題號和總題數的組合沒有上限，而且只是一行字串格式化
+    if mode == "跟讀模式":
+        progress_text = f"📚 數字 {index + 1} / {total}"
+    else:
+        progress_text = f"🎯 題目 {index + 1} / {total}"
+    return f"<div class='progress-text'>{progress_text}</div>"
+
+@lru_cache(maxsize=1024)
+def big_number_markup(number):
+    if number < 10000:
+        return f"<div class='big-number'>{number}</div>"
+    # 五位數以上加千分位，字也縮小，十億也放得進一行
+    text = f"{number:,}"
+    return f"<div class='big-number' style='font-size: {max(48, 900 // len(text))}px;'>{text}</div>"
+
+@lru_cache(maxsize=None)
+def recording_hint_markup(duration):
+    return f"""
+    <div style='text-align: center; margin: 20px 0;'>
+        <div style='font-size: 28px; color: #ff6b6b; font-weight: bold; margin-bottom: 20px;'>
+            👇 點擊下方的麥克風按鈕開始錄音 👇
+        </div>
+        <div style='font-size: 20px; color: #666;'>
+            建議錄音 {duration} 秒
+        </div>
+    </div>
+    """
+
+@lru_cache(maxsize=1024)
+def success_markup(emoji, msg, score):
+    return f"""
+    <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+                color: white; padding: 40px; border-radius: 20px; 
+                text-align: center; margin: 20px 0;'>
+        <div style='font-size: 100px; margin-bottom: 20px;'>{emoji}</div>
+        <div style='font-size: 36px; font-weight: bold; margin-bottom: 10px;'>{msg}</div>
+        <div style='font-size: 24px;'>發音相似度: {score}%</div>
+    </div>
+    """
+
+@lru_cache(maxsize=None)
+def encouragement_markup(close, encouragement, emoji):
+    if close:
+        color = "#fff3cd"
+        border_color = "#ffc107"
+        icon = "🙂"
+    else:
+        color = "#cce5ff"
+        border_color = "#0066cc"
+        icon = "💪"
+    return f"""
+    <div style='background: {color}; padding: 40px; border-radius: 20px; 
+                text-align: center; margin: 20px 0; border: 3px solid {border_color};'>
+        <div style='font-size: 80px; margin-bottom: 20px;'>{icon}</div>
+        <div style='font-size: 32px; font-weight: bold; color: #333; margin-bottom: 15px;'>{encouragement}</div>
+        <div style='font-size: 60px; margin: 20px 0;'>{emoji}</div>
+    </div>
+    """
+
+@lru_cache(maxsize=1024)
+def score_markup(score):
+    return f"""
+    <div style='text-align: center; font-size: 20px; color: #666; margin: 10px 0;'>
+        發音相似度: {score}%
+    </div>
+    """
 
 # =========================
 # 側邊欄設定
 # =========================
 st.sidebar.title("⚙️ 教師設定")
 
-start_n = st.sidebar.number_input("起始數字 N", min_value=1, max_value=100, value=1)
-end_n = st.sidebar.number_input("結束數字 S", min_value=1, max_value=100, value=20)
+start_n = st.sidebar.number_input("起始數字 N", min_value=1, max_value=MAX_NUMBER, value=1)
+end_n = st.sidebar.number_input("結束數字 S", min_value=1, max_value=MAX_NUMBER, value=20)
 
 if start_n > end_n:
     st.sidebar.error("起始數字不能大於結束數字！")
@@ -295,7 +659,13 @@ recording_duration = st.sidebar.slider(
     min_value=2,
     max_value=10,
     value=4,
-    help="小朋友發音的錄音時長"
+    help="小朋友發音的錄音時長（自動偵測模式下是最長錄音時間）"
+)
+
+capture_mode = st.sidebar.radio(
+    "錄音方式",
+    [CLICK_CAPTURE, STREAMING_CAPTURE],
+    help="自動偵測會在小朋友說完後自動停止錄音並開始辨識"
 )
 
 wait_after_teacher = st.sidebar.slider(
@@ -333,22 +703,93 @@ st.sidebar.info(tolerance_descriptions[tolerance_level])
 
 mode = st.sidebar.radio("選擇模式", ["跟讀模式", "闖關模式"])
 
+st.sidebar.markdown("---")
+st.sidebar.subheader("🎧 辨識設定")
+
+backend_names = list(BACKENDS)
+asr_backend = st.sidebar.selectbox(
+    "辨識引擎",
+    backend_names,
+    index=backend_names.index(DEFAULT_BACKEND) if DEFAULT_BACKEND in BACKENDS else 0,
+    format_func=lambda name: BACKENDS[name].label,
+    help="離線辨識不需要網路，只在目前數字範圍的單字中辨識"
+)
+
+preprocess_audio = st.sidebar.checkbox(
+    "錄音前處理",
+    value=True,
+    help="辨識前先轉成單聲道 16 kHz、去掉前後靜音並調整音量，上傳與辨識都比較快"
+)
+
+unavailable_reason = get_backend(asr_backend).unavailable_reason()
+if unavailable_reason:
+    st.sidebar.warning(f"{unavailable_reason}，暫時改用 Google 線上辨識")
+    asr_backend = "google"
+
+for name, stats in latency_stats.summary().items():
+    st.sidebar.caption(
+        f"⏱️ {BACKENDS[name].label}：平均 {stats['mean_ms']:.0f} ms"
+        f"（最近 {stats['last_ms']:.0f} ms，共 {stats['count']} 次）"
+    )
+
+tts_stats = get_audio_cache().stats()
+st.sidebar.caption(
+    f"🗂️ 語音快取：命中 {tts_stats['hits']} ／ 未命中 {tts_stats['misses']}"
+    f"（{tts_stats['entries']} 個檔案，{tts_stats['bytes'] / 1024:.0f} KB）"
+)
+if get_tts_pack() is not None:
+    st.sidebar.caption(f"📦 預錄音檔包：{len(get_tts_pack())} 個數字")
+
+# 伺服器剛啟動時清一次上次留下的暫存檔
+reap_orphaned_files()
+
+with st.sidebar.expander("🛠️ 管理"):
+    session_stats = session_registry.stats()
+    st.caption(
+        f"👥 目前 {session_stats['sessions']} 個 session，"
+        f"約 {session_stats['bytes'] / 1024:.0f} KB"
+    )
+    st.page_link("pages/管理.py", label="Session 管理頁", icon="🛠️")
+    st.page_link("pages/分析.py", label="教師分析頁", icon="📊")
+    st.checkbox(
+        "分析每次重跑的效能",
+        key="profile_reruns",
+        help="也可以在網址加上 ?profile=1；報告會存成 flame graph 可讀的摺疊堆疊"
+    )
+    if st.session_state.profile_reports:
+        report = st.session_state.profile_reports[-1]
+        st.caption(
+            f"🩺 上一次重跑（{report['tag']}）：{report['seconds'] * 1000:.0f} ms，"
+            f"取樣 {report['samples']} 次"
+        )
+        for label, own, total in report["top"][:5]:
+            st.caption(f"`{label}` 自身 {own} ／ 累計 {total}")
+        st.caption(f"完整報告：`{report['report_path']}`")
+
 st.sidebar.markdown("---")
 
 # 初始化按鈕
 if st.sidebar.button("🚀 開始練習", type="primary", use_container_width=True):
+    st.session_state.current_index = 0
+    st.session_state.mode = mode
     if mode == "跟讀模式":
-        st.session_state.numbers_list = list(range(start_n, end_n + 1))
+        # range 不會展開，範圍到十億也只存起點、終點
+        st.session_state.numbers_list = range(start_n, end_n + 1)
+        st.session_state.practice_total = len(st.session_state.numbers_list)
     else:
-        st.session_state.numbers_list = random.sample(
-            range(start_n, end_n + 1), 
-            min(10, end_n - start_n + 1)
-        )
-    st.session_state.current_index = 0
+        # 弱點分數跟著小朋友走：範圍沒變就沿用上一輪的
+        scheduler = st.session_state.scheduler
+        if scheduler is None or scheduler.number_range != (start_n, end_n):
+            st.session_state.scheduler = WeaknessScheduler(start_n, end_n)
+        st.session_state.scheduler.start_round()
+        st.session_state.numbers_list = []
+        st.session_state.practice_total = min(CHALLENGE_LENGTH, end_n - start_n + 1)
+        next_challenge_number()
     st.session_state.feedback = ""
     st.session_state.last_score = None
-    st.session_state.mode = mode
     st.session_state.challenge_correct = 0
+    cancel_recognition()
+    cancel_prefetch()
     st.session_state.phase = "ready"
 
 # =========================
@@ -410,200 +851,162 @@ if st.session_state.current_index >= len(st.session_state.numbers_list):
             st.session_state.feedback = ""
             st.session_state.challenge_correct = 0
             st.session_state.last_result = None
+            cancel_recognition()
+            cancel_prefetch()
             st.session_state.phase = "ready"
             st.rerun()
     
     st.stop()
 
-# 當前數字
-current_number = st.session_state.numbers_list[st.session_state.current_index]
-target_word = get_number_word(current_number)
-
-# 顯示進度
-if st.session_state.mode == "跟讀模式":
-    progress_text = f"📚 數字 {st.session_state.current_index + 1} / {len(st.session_state.numbers_list)}"
-else:
-    progress_text = f"🎯 題目 {st.session_state.current_index + 1} / {len(st.session_state.numbers_list)}"
-
-st.markdown(f"<div class='progress-text'>{progress_text}</div>", unsafe_allow_html=True)
-
-# 顯示數字
-st.markdown(f"<div class='big-number'>{current_number}</div>", unsafe_allow_html=True)
+# =========================
+# 練習區（fragment）
+# =========================
+# 練習區裡的按鈕只會重跑這個 fragment，CSS、側邊欄和標題都不會重新執行。
+# 切換階段的按鈕都用 on_click 先改好狀態，fragment 重跑時直接畫出新的階段。
+@st.fragment
+def practice_area():
+    keep_session_alive()
+    if st.session_state.current_index >= len(st.session_state.numbers_list):
+        # 最後一題做完要換成成績畫面（在頁面上半部），整頁重跑；
+        # 不在按鈕的 callback 裡 st.rerun()，有些 Streamlit 版本在那裡呼叫不會有作用
+        st.rerun()
+    current_number = st.session_state.numbers_list[st.session_state.current_index]
+    target_word = get_number_word(current_number)
+    prefetch_upcoming()
+    
+    # 顯示進度與數字
+    st.markdown(
+        progress_markup(st.session_state.mode, st.session_state.current_index, st.session_state.practice_total),
+        unsafe_allow_html=True
+    )
+    st.markdown(big_number_markup(current_number), unsafe_allow_html=True)
+    
+    # 流程控制（每個階段的重跑時間都記進效能指標）
+    with metrics.timed("render", phase=st.session_state.phase):
+        if st.session_state.phase == "ready":
+            render_ready()
+        elif st.session_state.phase == "played":
+            render_played(current_number, target_word)
+        elif st.session_state.phase == "processing":
+            render_processing(current_number)
+        
+        # 顯示結果
+        if st.session_state.phase == "result":
+            render_result(target_word)
 
-# 流程控制
-if st.session_state.phase == "ready":
+def render_ready():
     # 第一步：播放老師發音
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        if st.button("🔊 第一步：聽老師發音", use_container_width=True, type="primary", key="play_teacher"):
-            audio_file = generate_tts(current_number)
-            st.audio(audio_file, format="audio/mp3", autoplay=True)
-            st.session_state.phase = "played"
-            st.rerun()
+        st.button(
+            "🔊 第一步：聽老師發音", use_container_width=True, type="primary", key="play_teacher",
+            on_click=play_teacher
+        )
     
-    st.markdown("""
-    <div style='text-align: center; margin: 30px 0; padding: 20px; background: #e3f2fd; border-radius: 10px;'>
-        <div style='font-size: 24px; color: #1976d2;'>
-            👆 點擊按鈕聽老師怎麼唸
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(READY_HINT_MARKUP, unsafe_allow_html=True)
 
-elif st.session_state.phase == "played":
+def render_played(current_number, target_word):
+    try:
+        warm_up_recognition()
+    except JobPoolFull:
+        pass
+    
+    # 剛按下播放時才自動播放一次老師發音
+    if st.session_state.pop("play_teacher_audio", False):
+        play_teacher_audio(current_number)
+    
     # 顯示已播放狀態
     st.success("✅ 已播放老師發音")
     
-    st.markdown("""
-    <div class='blink-text' style='margin: 30px 0;'>
-        🎙️ 換你練習囉！
-    </div>
-    """, unsafe_allow_html=True)
-    
-    st.markdown(f"""
-    <div style='text-align: center; margin: 20px 0;'>
-        <div style='font-size: 28px; color: #ff6b6b; font-weight: bold; margin-bottom: 20px;'>
-            👇 點擊下方的麥克風按鈕開始錄音 👇
-        </div>
-        <div style='font-size: 20px; color: #666;'>
-            建議錄音 {recording_duration} 秒
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(YOUR_TURN_MARKUP, unsafe_allow_html=True)
+    st.markdown(recording_hint_markup(recording_duration), unsafe_allow_html=True)
     
     # 錄音介面 - 直接顯示，不需要等待
     st.markdown("<br>", unsafe_allow_html=True)
     
     col_a, col_b, col_c = st.columns([1, 2, 1])
     with col_b:
-        st.markdown("""
-        <div style='padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                    border-radius: 15px; margin: 20px 0;'>
-            <div style='text-align: center; color: white; font-size: 24px; font-weight: bold; margin-bottom: 15px;'>
-                🎤 第二步：錄下你的發音
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(RECORD_STEP_MARKUP, unsafe_allow_html=True)
         
-        audio_bytes = st.audio_input(
-            "點擊麥克風開始 → 錄音 → 再點一次停止",
-            key=f"audio_{current_number}_{st.session_state.current_index}"
-        )
+        if capture_mode == STREAMING_CAPTURE:
+            recorded = capture_streaming(
+                f"stream_{current_number}_{st.session_state.current_index}",
+                recording_duration
+            )
+        else:
+            audio_bytes = st.audio_input(
+                "點擊麥克風開始 → 錄音 → 再點一次停止",
+                key=f"audio_{current_number}_{st.session_state.current_index}"
+            )
+            recorded = audio_bytes.getvalue() if audio_bytes else None
     
     # 說明文字
-    st.markdown("""
-    <div style='text-align: center; margin: 20px 0; padding: 15px; background: #fff9c4; border-radius: 10px;'>
-        <div style='font-size: 18px; color: #f57f17;'>
-            💡 <b>操作提示：</b><br>
-            1️⃣ 點擊上方的麥克風圖示（瀏覽器會詢問麥克風權限，請允許）<br>
-            2️⃣ 對著麥克風清楚地唸出數字<br>
-            3️⃣ 錄音完成後再點一次停止<br>
-            4️⃣ 系統會自動判斷你的發音
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    if capture_mode == STREAMING_CAPTURE:
+        st.markdown(STREAMING_TIPS_MARKUP, unsafe_allow_html=True)
+    else:
+        st.markdown(CLICK_TIPS_MARKUP, unsafe_allow_html=True)
     
-    if audio_bytes:
+    if recorded:
         st.balloons()
         st.success("🎉 錄音完成！正在判斷中...")
-        
-        with st.spinner("🔍 AI 正在仔細聆聽你的發音..."):
-            feedback, score, is_correct, result = process_audio(
-                audio_bytes.getvalue(), 
-                target_word, 
-                score_good, 
-                score_ok,
-                tolerance_level
-            )
-            
-            st.session_state.feedback = feedback
-            st.session_state.last_score = score
-            st.session_state.last_result = result
-            st.session_state.phase = "result"
-            
-            if is_correct:
-                st.session_state.challenge_correct += 1
-            
-            st.rerun()
+        start_recognition(recorded, target_word, current_number)
+        rerun_practice()
     
     # 重新播放按鈕
     st.markdown("<br>", unsafe_allow_html=True)
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         if st.button("🔄 再聽一次老師發音", use_container_width=True):
-            audio_file = generate_tts(current_number)
-            st.audio(audio_file, format="audio/mp3", autoplay=True)
+            play_teacher_audio(current_number)
+
+def render_processing(current_number):
+    st.success("🎉 錄音完成！正在判斷中...")
+    
+    recognition_status()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button(
+            "🔄 再試一次", use_container_width=True, type="secondary", key="cancel_recognition",
+            on_click=reset_attempt
+        )
+    with col2:
+        if st.button("🔊 再聽一次老師發音", use_container_width=True, key="replay_processing"):
+            play_teacher_audio(current_number)
 
-# 顯示結果
-if st.session_state.phase == "result":
+def render_result(target_word):
     st.markdown("---")
     
     if st.session_state.feedback == "correct":
         emoji, msg = get_success_message()
-        st.markdown(f"""
-        <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                    color: white; padding: 40px; border-radius: 20px; 
-                    text-align: center; margin: 20px 0;'>
-            <div style='font-size: 100px; margin-bottom: 20px;'>{emoji}</div>
-            <div style='font-size: 36px; font-weight: bold; margin-bottom: 10px;'>{msg}</div>
-            <div style='font-size: 24px;'>發音相似度: {st.session_state.last_score}%</div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(success_markup(emoji, msg, st.session_state.last_score), unsafe_allow_html=True)
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            if st.button("➡️ 下一個數字", use_container_width=True, type="primary"):
-                st.session_state.current_index += 1
-                st.session_state.feedback = ""
-                st.session_state.last_score = None
-                st.session_state.last_result = None
-                st.session_state.phase = "ready"
-                st.rerun()
+            st.button(
+                "➡️ 下一個數字", use_container_width=True, type="primary",
+                on_click=reset_attempt, kwargs={"advance": True}
+            )
                 
     else:
         encouragement, emoji = get_encouragement()
-        
-        if st.session_state.feedback == "close":
-            color = "#fff3cd"
-            border_color = "#ffc107"
-            icon = "🙂"
-        else:
-            color = "#cce5ff"
-            border_color = "#0066cc"
-            icon = "💪"
-        
-        st.markdown(f"""
-        <div style='background: {color}; padding: 40px; border-radius: 20px; 
-                    text-align: center; margin: 20px 0; border: 3px solid {border_color};'>
-            <div style='font-size: 80px; margin-bottom: 20px;'>{icon}</div>
-            <div style='font-size: 32px; font-weight: bold; color: #333; margin-bottom: 15px;'>{encouragement}</div>
-            <div style='font-size: 60px; margin: 20px 0;'>{emoji}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(
+            encouragement_markup(st.session_state.feedback == "close", encouragement, emoji),
+            unsafe_allow_html=True
+        )
         
         if st.session_state.last_score is not None:
-            st.markdown(f"""
-            <div style='text-align: center; font-size: 20px; color: #666; margin: 10px 0;'>
-                發音相似度: {st.session_state.last_score}%
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(score_markup(st.session_state.last_score), unsafe_allow_html=True)
         
         col1, col2 = st.columns(2)
         with col1:
-            if st.button("🔄 再試一次", use_container_width=True, type="secondary"):
-                st.session_state.feedback = ""
-                st.session_state.last_score = None
-                st.session_state.last_result = None
-                st.session_state.phase = "ready"
-                st.rerun()
+            st.button("🔄 再試一次", use_container_width=True, type="secondary", on_click=reset_attempt)
         
         with col2:
-            if st.button("⏭️ 跳過這題", use_container_width=True):
-                st.session_state.current_index += 1
-                st.session_state.feedback = ""
-                st.session_state.last_score = None
-                st.session_state.last_result = None
-                st.session_state.phase = "ready"
-                st.rerun()
+            st.button(
+                "⏭️ 跳過這題", use_container_width=True,
+                on_click=reset_attempt, kwargs={"advance": True}
+            )
         
         # 顯示辨識結果
         if st.session_state.last_result:
@@ -612,7 +1015,31 @@ if st.session_state.phase == "result":
                 with col_a:
                     st.info(f"**目標發音:**\n\n`{target_word}`")
                 with col_b:
-                    st.success(f"**系統聽到:**\n\n`{st.session_state.last_result}`")
+                    heard = f"`{st.session_state.last_result}`"
+                    if st.session_state.last_number is not None:
+                        heard += f" → **{st.session_state.last_number}**"
+                    st.success(f"**系統聽到:**\n\n{heard}")
+                
+                if st.session_state.last_latency and st.session_state.last_latency[1] is not None:
+                    backend_name, latency_ms = st.session_state.last_latency
+                    st.caption(f"⏱️ {BACKENDS[backend_name].label} 辨識耗時 {latency_ms:.0f} ms")
+                
+                report = st.session_state.last_preprocessing
+                if report:
+                    st.caption(
+                        f"🎚️ 前處理：{report['original_bytes'] / 1024:.0f} KB → "
+                        f"{report['processed_bytes'] / 1024:.0f} KB（省下 {report['bytes_saved'] / 1024:.0f} KB），"
+                        f"裁掉 {report['seconds_trimmed']:.1f} 秒靜音，耗時 {report['preprocess_ms']:.0f} ms"
+                    )
+                
+                if len(st.session_state.last_alternatives) > 1:
+                    st.markdown("**其他候選結果:**")
+                    for hypothesis, hypothesis_score in st.session_state.last_alternatives:
+                        marker = "✅" if hypothesis == st.session_state.last_result else "▫️"
+                        st.markdown(f"{marker} `{hypothesis}` — {hypothesis_score:.0f}%")
+
+practice_area()
+
 
 # 可愛提示區
 st.markdown("---")
@@ -57,7 +57,7 @@ if not st.session_state.challenge_finished:
         st.session_state.challenge_index += 1
         if st.session_state.challenge_index >= 10:
             st.session_state.challenge_finished = True
-        st.experimental_rerun()
+        st.rerun()
 
 # ------------------------
 # Challenge Finished
@@ -78,4 +78,4 @@ if st.session_state.challenge_finished:
         st.session_state.challenge_index = 0
         st.session_state.challenge_correct = 0
         st.session_state.challenge_finished = False
-        st.experimental_rerun()
+        st.rerun()
@@ -0,0 +1,281 @@
+"""
+練習紀錄
+
+每次辨識的結果（數字、目標單字、辨識出的文字、分數、容錯等級、延遲、時間）
+都寫進本機的 SQLite 檔，session 結束後還查得到小朋友的進步。
+
+- record() 只把紀錄放進記憶體的佇列就回傳，不碰磁碟，不會拖慢畫面重跑
+- 背景寫入執行緒累積到 BATCH_SIZE 筆、或第一筆進來後過了 FLUSH_INTERVAL 秒，
+  就用一個交易整批寫入
+- 資料庫用 WAL 模式，寫入時其他行程（例如分析頁）照樣可以讀
+- 資料表結構的版本記在 PRAGMA user_version，開檔時依序套用還沒跑過的 MIGRATIONS
+- 超過 ATTEMPT_RETENTION_DAYS 天的紀錄，寫入執行緒每 PRUNE_INTERVAL 秒清一次
+
+環境變數：
+
+    ATTEMPT_LOG_PATH=attempts.db    資料庫檔案（設成空字串則不記錄）
+    ATTEMPT_RETENTION_DAYS=365      保留天數（0 表示永久保留）
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+DEFAULT_PATH = os.environ.get("ATTEMPT_LOG_PATH", "attempts.db")
+RETENTION_DAYS = float(os.environ.get("ATTEMPT_RETENTION_DAYS", 365))
+BATCH_SIZE = 64
+FLUSH_INTERVAL = 2.0
+PRUNE_INTERVAL = 60 * 60
+MAX_BUFFER = 10000
+
+COLUMNS = (
+    "created_at", "session_id", "mode", "number", "target_word", "transcript",
+    "recognized_number", "score", "is_correct", "feedback", "tolerance_level",
+    "backend", "latency_ms",
+)
+
+# 只能往後加，不能改已經發出去的版本；第 N 筆跑完後 user_version 就是 N
+MIGRATIONS = [
+    """
+    CREATE TABLE attempts (
+        id INTEGER PRIMARY KEY,
+        created_at REAL NOT NULL,
+        session_id TEXT,
+        mode TEXT,
+        number INTEGER,
+        target_word TEXT,
+        transcript TEXT,
+        recognized_number INTEGER,
+        score REAL,
+        is_correct INTEGER NOT NULL DEFAULT 0,
+        feedback TEXT,
+        tolerance_level TEXT,
+        backend TEXT,
+        latency_ms REAL
+    );
+    CREATE INDEX attempts_created_at ON attempts (created_at);
+    """,
+    """
+    CREATE INDEX attempts_number ON attempts (number, created_at);
+    """,
+    # 教師分析用的加總表（見 analytics.py）；既有紀錄在這裡補算一次，
+    # 「聽成了什麼」用 migrate() 註冊的 heard_as，跟之後寫入與清除時的鍵一致。
+    # 時間索引順便帶上 is_correct，每日趨勢只要讀索引
+    """
+    DROP INDEX attempts_created_at;
+    CREATE INDEX attempts_created_at ON attempts (created_at, is_correct);
+    CREATE TABLE number_stats (
+        number INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL,
+        passes INTEGER NOT NULL,
+        score_sum REAL NOT NULL,
+        scored INTEGER NOT NULL
+    );
+    CREATE TABLE confusions (
+        number INTEGER NOT NULL,
+        heard TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (number, heard)
+    );
+    INSERT INTO number_stats (number, attempts, passes, score_sum, scored)
+        SELECT number, COUNT(*), SUM(is_correct), TOTAL(score), COUNT(score)
+        FROM attempts WHERE number IS NOT NULL GROUP BY number;
+    INSERT INTO confusions (number, heard, count)
+        SELECT number, heard, COUNT(*) FROM (
+            SELECT number, heard_as(recognized_number, transcript) AS heard
+            FROM attempts WHERE number IS NOT NULL AND NOT is_correct
+        )
+        WHERE heard IS NOT NULL AND heard != CAST(number AS TEXT)
+        GROUP BY number, heard;
+    """,
+]
+
+# 加總表需要的欄位，順序與 analytics.update_aggregates 一致
+AGGREGATE_COLUMNS = ("number", "is_correct", "score", "recognized_number", "transcript")
+
+_STOP = object()
+
+
+def connect(path):
+    """開啟資料庫並套用還沒跑過的結構變更"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL 模式下 NORMAL 只在 checkpoint 時 fsync，斷電最多掉最後幾批
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate(conn)
+    return conn
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < len(MIGRATIONS):
+        from analytics import heard_as
+
+        # 補算加總表時要跟 analytics 用同一套正規化，不然清除過期紀錄時扣不到同一列
+        conn.create_function("heard_as", 2, heard_as, deterministic=True)
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        # 結構變更與版本號放在同一個交易裡，中途失敗下次會從同一版重來
+        conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+    return len(MIGRATIONS)
+
+
+class AttemptLog:
+    """緩衝在記憶體、由背景執行緒整批寫入 SQLite 的練習紀錄"""
+
+    def __init__(self, path=DEFAULT_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 retention_days=RETENTION_DAYS, max_buffer=MAX_BUFFER):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.pruned = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def record(self, **fields):
+        """把一筆紀錄放進佇列；沒給 created_at 就用現在的時間"""
+        if not self.enabled:
+            return
+        fields.setdefault("created_at", time.time())
+        fields["is_correct"] = bool(fields.get("is_correct"))
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            # 寫入跟不上（例如磁碟卡住）時寧可丟紀錄，也不讓小朋友等
+            self.dropped += 1
+            metrics.inc("attempt_log_dropped")
+
+    def flush(self, timeout=5.0):
+        """等佇列裡目前為止的紀錄都寫進資料庫（測試與關機時用）"""
+        if self._thread is None:
+            return True
+        written = threading.Event()
+        self._queue.put(written)
+        return written.wait(timeout)
+
+    def close(self, timeout=5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="attempt-log", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """
+        等第一筆進來，之後最多再等 flush_interval 秒湊成一批；
+        回傳 (紀錄, 等待寫完的 Event, 是否要停止)
+        """
+        batch = []
+        waiters = []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is _STOP:
+                return batch, waiters, True
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+                return batch, waiters, False
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, waiters, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, waiters, False
+
+    def _run(self):
+        conn = None
+        last_prune = None
+        stop = False
+        while not stop:
+            batch, waiters, stop = self._next_batch()
+            try:
+                if conn is None:
+                    conn = connect(self.path)
+                if batch:
+                    self._write(conn, batch)
+                if last_prune is None or time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                    last_prune = time.monotonic()
+                    self.prune(conn)
+            except sqlite3.Error:
+                # 這一批就放棄，下一批重新開檔再試
+                self.errors += 1
+                metrics.inc("attempt_log_errors")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+            for waiter in waiters:
+                waiter.set()
+        if conn is not None:
+            conn.close()
+
+    def _write(self, conn, batch):
+        # analytics 會載入 numpy 與評分模組，只在寫入執行緒第一次寫入時才載入
+        from analytics import update_aggregates
+
+        with metrics.timed("attempt_log_write"):
+            rows = [tuple(fields.get(column) for column in COLUMNS) for fields in batch]
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO attempts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows,
+                )
+                update_aggregates(conn, [tuple(fields.get(column) for column in AGGREGATE_COLUMNS)
+                                         for fields in batch])
+        self.written += len(batch)
+        metrics.inc("attempts_written", len(batch))
+
+    def prune(self, conn):
+        """刪掉超過保留天數的紀錄，並從分析的加總裡扣掉"""
+        from analytics import update_aggregates
+
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 24 * 60 * 60
+        with conn:
+            expired = conn.execute(
+                f"SELECT {', '.join(AGGREGATE_COLUMNS)} FROM attempts WHERE created_at < ?", (cutoff,)
+            ).fetchall()
+            update_aggregates(conn, expired, sign=-1)
+            deleted = conn.execute("DELETE FROM attempts WHERE created_at < ?", (cutoff,)).rowcount
+        self.pruned += deleted
+        return deleted
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "pruned": self.pruned,
+            "errors": self.errors,
+        }
+
+
+attempt_log = AttemptLog()
+# 正常關機時把還在佇列裡的紀錄寫完
+atexit.register(attempt_log.close)
@@ -0,0 +1,219 @@
+"""
+共用 TTS 音檔快取
+
+以 (text, lang, engine) 的內容雜湊作為檔名，把音檔位元組存在磁碟上，
+同一台主機上的所有 session 與 Streamlit 行程共用同一份快取。
+總容量超過上限時，依最近使用時間（mtime）淘汰最舊的檔案。
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "TTS_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "english-number-practice-tts"),
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# 命中時，檔案超過這麼多秒沒更新 mtime 才更新一次（LRU 只需要粗略的使用時間）
+TOUCH_INTERVAL = 600
+
+
+def cache_key(text, lang, engine):
+    """以內容雜湊作為快取鍵，相同的文字、語言、引擎一定對應同一個檔案"""
+    raw = f"{engine}\0{lang}\0{text}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class AudioCache:
+    """磁碟上的內容定址音檔快取，附 LRU 淘汰與命中統計"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, suffix=".mp3"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        # 只是本行程的估計值（不含其他行程寫入的檔案）；淘汰時才重新掃描目錄取得真實大小
+        entries = self._scan()
+        self._approx_entries = len(entries)
+        self._approx_bytes = sum(size for _, size, _ in entries)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _scan(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix) or entry.name.startswith("."):
+                        continue
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((info.st_mtime, info.st_size, entry.path))
+        except FileNotFoundError:
+            os.makedirs(self.directory, exist_ok=True)
+        return entries
+
+    def get(self, text, lang, engine):
+        path = self._path(cache_key(text, lang, engine))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+                mtime = os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新 mtime，讓 LRU 淘汰知道這個檔案最近被用過；剛更新過就不用每次都寫
+        if time.time() - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def contains(self, text, lang, engine):
+        """只檢查有沒有快取，不讀檔、不算進命中統計（預先合成用來跳過已經有的）"""
+        return os.path.exists(self._path(cache_key(text, lang, engine)))
+
+    def put(self, text, lang, engine, data):
+        path = self._path(cache_key(text, lang, engine))
+        try:
+            previous = os.stat(path).st_size
+        except FileNotFoundError:
+            previous = None
+        # 先寫入暫存檔再 rename，其他行程不會讀到寫一半的檔案
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=self.suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if previous is None:
+                self._approx_entries += 1
+                self._approx_bytes += len(data)
+            else:
+                self._approx_bytes += len(data) - previous
+            over_limit = self._approx_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def get_or_create(self, text, lang, engine, render):
+        """快取命中就直接回傳，否則呼叫 render() 產生音檔並寫入快取"""
+        data = self.get(text, lang, engine)
+        if data is None:
+            data = render()
+            self.put(text, lang, engine, data)
+        return data
+
+    def evict(self):
+        """刪除最久沒用到的檔案，直到總容量低於上限"""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._approx_entries = len(entries) - removed
+            self._approx_bytes = total
+            self.evictions += removed
+
+    def stats(self):
+        """檔案數與大小是本行程的估計值，不掃描目錄（每次重跑的側邊欄都會呼叫）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": self._approx_entries,
+                "bytes": self._approx_bytes,
+            }
+
+
+class SharedAudioCache:
+    """
+    跟 AudioCache 一樣的介面，音檔改放在 cache_backends 的共用儲存
+    （設定了 CACHE_BACKEND 時使用，例如多台主機共用一個網路儲存）
+    """
+
+    NAMESPACE = "tts"
+    # 記住這麼多個確定已經在共用儲存裡的鍵，預先合成重複詢問時不用每次都去問
+    KNOWN_KEYS_LIMIT = 4096
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._known = set()
+
+    def _remember(self, key):
+        with self._lock:
+            if len(self._known) >= self.KNOWN_KEYS_LIMIT:
+                self._known.clear()
+            self._known.add(key)
+
+    def get(self, text, lang, engine):
+        key = cache_key(text, lang, engine)
+        data = self.backend.get(self.NAMESPACE, key)
+        if data is not None:
+            self._remember(key)
+        return data
+
+    def contains(self, text, lang, engine):
+        key = cache_key(text, lang, engine)
+        if key in self._known:
+            return True
+        if self.backend.contains(self.NAMESPACE, key):
+            self._remember(key)
+            return True
+        return False
+
+    def put(self, text, lang, engine, data):
+        key = cache_key(text, lang, engine)
+        self.backend.put(self.NAMESPACE, key, data)
+        self._remember(key)
+
+    def get_or_create(self, text, lang, engine, render):
+        key = cache_key(text, lang, engine)
+        data = self.backend.get_or_create(self.NAMESPACE, key, render)
+        self._remember(key)
+        return data
+
+    def stats(self):
+        counts = self.backend.stats()["namespaces"].get(self.NAMESPACE, {})
+        entries, size = self.backend.size(self.NAMESPACE)
+        return {
+            "hits": counts.get("hits", 0),
+            "misses": counts.get("misses", 0),
+            "evictions": 0,
+            "hit_rate": counts.get("hit_rate", 0.0),
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,206 @@
+"""
+錄音處理
+
+- 串流錄音時用簡單的能量門檻做語音活動偵測（VAD）：先量測背景噪音，
+  偵測到說話後，只要安靜超過一小段時間就判定小朋友說完了，
+  不必等小朋友自己按停止。
+- 送去辨識前的前處理：解碼一次、混成單聲道、降取樣到 16 kHz、
+  裁掉前後靜音、調整音量，送出去的資料量通常只剩原本的幾分之一。
+
+全部都是向量化的 NumPy 運算。
+"""
+import io
+import time
+
+import numpy as np
+import soundfile as sf
+
+FRAME_MS = 20
+TARGET_SAMPLE_RATE = 16000
+WAV_HEADER_BYTES = 44
+
+
+def frame_energy_db(samples, sample_rate, frame_ms=FRAME_MS):
+    """把訊號切成固定長度的音框，回傳每個音框的 RMS 能量（dBFS）"""
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.empty(0)
+    frames = np.asarray(samples[:count * frame_length], dtype=np.float64).reshape(count, frame_length)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def frame_to_mono(frame):
+    """把 av.AudioFrame 轉成 [-1, 1] 的單聲道 float32 陣列"""
+    samples = frame.to_ndarray()
+    scale = float(np.iinfo(samples.dtype).max + 1) if np.issubdtype(samples.dtype, np.integer) else 1.0
+    channels = len(frame.layout.channels)
+    if frame.format.is_planar:
+        samples = samples.reshape(channels, -1).mean(axis=0)
+    else:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return (samples / scale).astype(np.float32)
+
+
+def to_wav_bytes(samples, sample_rate):
+    """float 單聲道訊號 → 16-bit PCM WAV 位元組（跟 st.audio_input 相同格式）"""
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+class EnergyVAD:
+    """
+    串流式端點偵測
+
+    前 calibrate_ms 的音框用來估計背景噪音，門檻是噪音再加 margin_db
+    （但不低於 min_threshold_db）。連續 min_speech_ms 超過門檻算開始說話，
+    說話後連續 end_silence_ms 低於門檻就算說完；錄滿 max_seconds 也會停止。
+    """
+
+    def __init__(self, max_seconds, frame_ms=FRAME_MS, calibrate_ms=200, margin_db=12.0,
+                 min_threshold_db=-45.0, min_speech_ms=120, end_silence_ms=700):
+        self.max_seconds = max_seconds
+        self.frame_ms = frame_ms
+        self.margin_db = margin_db
+        self.min_threshold_db = min_threshold_db
+        self._calibrate_frames = max(1, calibrate_ms // frame_ms)
+        self._min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self._end_silence_frames = max(1, end_silence_ms // frame_ms)
+
+        self.sample_rate = None
+        self.threshold_db = None
+        self.speech_started = False
+        self.ended = False
+        self._chunks = []
+        self._pending = np.empty(0, dtype=np.float32)
+        self._noise = []
+        self._loud_run = 0
+        self._quiet_run = 0
+        self._samples = 0
+
+    @property
+    def seconds(self):
+        return self._samples / self.sample_rate if self.sample_rate else 0.0
+
+    def push(self, samples, sample_rate):
+        """餵入一段單聲道訊號，回傳是否已經偵測到說完（或錄滿）"""
+        if self.ended:
+            return True
+        if self.sample_rate is None:
+            self.sample_rate = sample_rate
+
+        self._chunks.append(samples)
+        self._samples += len(samples)
+
+        # 不足一個音框的尾巴留到下一次再算
+        frame_length = max(1, int(self.sample_rate * self.frame_ms / 1000))
+        pending = np.concatenate([self._pending, samples])
+        usable = len(pending) // frame_length * frame_length
+        self._pending = pending[usable:]
+
+        for energy in frame_energy_db(pending[:usable], self.sample_rate, self.frame_ms):
+            self._update(energy)
+            if self.ended:
+                break
+
+        if self.seconds >= self.max_seconds:
+            self.ended = True
+        return self.ended
+
+    def _update(self, energy):
+        if self.threshold_db is None:
+            self._noise.append(energy)
+            if len(self._noise) >= self._calibrate_frames:
+                noise_floor = float(np.median(self._noise))
+                self.threshold_db = max(self.min_threshold_db, noise_floor + self.margin_db)
+            return
+
+        if energy >= self.threshold_db:
+            self._loud_run += 1
+            self._quiet_run = 0
+            if self._loud_run >= self._min_speech_frames:
+                self.speech_started = True
+        else:
+            self._loud_run = 0
+            self._quiet_run += 1
+            if self.speech_started and self._quiet_run >= self._end_silence_frames:
+                self.ended = True
+
+    def audio(self):
+        """目前收到的完整錄音（單聲道 float32）"""
+        if not self._chunks:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(self._chunks)
+
+    def wav_bytes(self):
+        return to_wav_bytes(self.audio(), self.sample_rate or 16000)
+
+
+def resample(samples, source_rate, target_rate=TARGET_SAMPLE_RATE):
+    """以 FFT 重新取樣（頻寬受限，降取樣時不會混疊）"""
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    target_length = max(1, int(round(len(samples) * target_rate / source_rate)))
+    spectrum = np.fft.rfft(samples)
+    keep = target_length // 2 + 1
+    if len(spectrum) >= keep:
+        spectrum = spectrum[:keep]
+    else:
+        spectrum = np.concatenate([spectrum, np.zeros(keep - len(spectrum), dtype=spectrum.dtype)])
+    return np.fft.irfft(spectrum, target_length) * (target_length / len(samples))
+
+
+def trim_silence(samples, sample_rate, relative_db=35.0, floor_db=-55.0, pad_ms=150):
+    """裁掉前後比最大音量低 relative_db 以上的音框，前後各保留 pad_ms"""
+    energies = frame_energy_db(samples, sample_rate)
+    if len(energies) == 0:
+        return samples
+    threshold = max(energies.max() - relative_db, floor_db)
+    voiced = np.flatnonzero(energies >= threshold)
+    if len(voiced) == 0:
+        return samples
+
+    frame_length = max(1, int(sample_rate * FRAME_MS / 1000))
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(0, voiced[0] * frame_length - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + pad)
+    return samples[start:end]
+
+
+def normalize_gain(samples, peak=0.9):
+    """把最大振幅調到 peak；幾乎沒聲音的錄音不放大，避免只放大噪音"""
+    loudest = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    if loudest < 1e-3:
+        return samples
+    return samples * (peak / loudest)
+
+
+def preprocess_recording(audio_bytes, target_rate=TARGET_SAMPLE_RATE):
+    """
+    解碼錄音並做完整前處理，回傳 (16-bit PCM 位元組, 取樣率, 報告)
+
+    報告記錄前處理前後的大小與長度，以及前處理本身花的時間。
+    """
+    started = time.perf_counter()
+    samples, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    original_seconds = len(samples) / sample_rate
+
+    mono = samples.mean(axis=1)
+    mono = resample(mono, sample_rate, target_rate)
+    mono = trim_silence(mono, target_rate)
+    mono = normalize_gain(mono)
+    pcm = (np.clip(mono, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+    processed_bytes = len(pcm) + WAV_HEADER_BYTES
+    report = {
+        "original_bytes": len(audio_bytes),
+        "processed_bytes": processed_bytes,
+        "bytes_saved": len(audio_bytes) - processed_bytes,
+        "original_seconds": original_seconds,
+        "processed_seconds": len(mono) / target_rate,
+        "seconds_trimmed": original_seconds - len(mono) / target_rate,
+        "preprocess_ms": (time.perf_counter() - started) * 1000,
+    }
+    return pcm, target_rate, report
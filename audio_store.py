@@ -0,0 +1,155 @@
+"""
+老師發音的 HTTP 服務
+
+st.audio(bytes) 每次播放都會把音檔重新算雜湊、放進 Streamlit 的 media 儲存區，
+而 /media 路由不送任何快取標頭，「再聽一次」時瀏覽器還是會重新下載一次。
+
+這裡把老師發音當成不會再變的位元組，以內容雜湊為鍵放在記憶體裡，
+透過 /api/audio/<雜湊>.mp3 提供：
+
+- ETag 就是內容雜湊，Cache-Control 是一年、immutable
+- If-None-Match 相符時回 304；支援單一區段的 Range（Safari 播放前會先要一小段）
+
+同一個數字的網址永遠不變，重播時瀏覽器直接用自己的快取，伺服器不用再做任何事。
+自訂路由要用 st.App 掛上去（見 server.py）：
+
+    streamlit run server.py
+
+有設定 server.baseUrlPath（例如放在反向代理的子路徑底下）時，路由與網址都會加上它。
+直接 streamlit run app.py 時沒有這個路由（mounted 是 False），app.py 退回 st.audio。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+ROUTE_PREFIX = "/api/audio"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_MAX_BYTES = int(os.environ.get("AUDIO_STORE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+def route_prefix(base_url_path=""):
+    """加上 server.baseUrlPath 的路由前綴，例如 /kids/api/audio"""
+    base = (base_url_path or "").strip("/")
+    return f"/{base}{ROUTE_PREFIX}" if base else ROUTE_PREFIX
+
+
+def parse_range(header, size):
+    """解析 bytes=start-end（也接受 start- 與 -suffix），回傳 (start, end)；不合法或多段時回傳 None"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                return None
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+class AudioStore:
+    """以內容雜湊為鍵、有容量上限（LRU）的記憶體音檔庫"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.mounted = False
+        self.prefix = ROUTE_PREFIX
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.served = 0
+        self.not_modified = 0
+        self.missing = 0
+        self.evictions = 0
+
+    def put(self, data):
+        """存入音檔並回傳它的鍵；內容一樣的音檔只會存一份"""
+        key = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return key
+            self._entries[key] = bytes(data)
+            self._bytes += len(data)
+            # 至少留下剛放進來的這一個，網頁馬上就要用
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+        return key
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def url(self, key):
+        return f"{self.prefix}/{key}.mp3"
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "served": self.served,
+                "not_modified": self.not_modified,
+                "missing": self.missing,
+                "evictions": self.evictions,
+            }
+
+
+audio_store = AudioStore()
+
+
+def audio_routes(store=audio_store):
+    """給 st.App 的路由：GET/HEAD [baseUrlPath]/api/audio/<鍵>.mp3"""
+    import streamlit as st
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    async def serve_audio(request):
+        key = request.path_params["key"]
+        data = store.get(key)
+        if data is None:
+            store._count("missing")
+            return Response(status_code=404)
+
+        etag = f'"{key}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if "*" in tags or etag in tags:
+                store._count("not_modified")
+                return Response(status_code=304, headers=headers)
+
+        store._count("served")
+        range_header = request.headers.get("range")
+        if range_header is None:
+            return Response(data, media_type="audio/mpeg", headers=headers)
+        byte_range = parse_range(range_header, len(data))
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{len(data)}"
+            return Response(status_code=416, headers=headers)
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(data[start:end + 1], status_code=206, media_type="audio/mpeg", headers=headers)
+
+    # st.App 的自訂路由不會自動加上 baseUrlPath，網頁上用的網址也要跟著加
+    store.prefix = route_prefix(st.get_option("server.baseUrlPath"))
+    store.mounted = True
+    return [Route(store.prefix + "/{key}.mp3", serve_audio, methods=["GET", "HEAD"])]
@@ -0,0 +1,258 @@
+"""
+App 端到端負載與延遲基準測試
+
+以 streamlit.testing.v1.AppTest 驅動真正的 app.py，模擬多位學生同時練習：
+
+    開始練習 → 聽老師發音（ready → played）→ 錄音送出辨識（played → processing）
+    → 等待結果（processing → result）→ 下一個數字（result → ready）
+
+- gTTS 換成本機替身：固定延遲後回傳假的 mp3，快取放在獨立的暫存目錄
+- 辨識引擎換成本機替身：學生的錄音是頻率對應數字的正弦波，替身用 FFT
+  找出頻率還原數字，並依 --error-rate 偶爾聽成相鄰的數字
+- AppTest 無法操作 st.audio_input，所以錄音這一步由測試把辨識工作送進
+  背景工作池（參數與 app 的 start_recognition 相同），其餘都是 app.py 本身的流程
+
+AppTest 每次執行都會替換行程共用的 Runtime，同時執行會互相干擾，
+所以每次重跑腳本時都持有一把全域鎖；背景辨識與 TTS 仍然是並行的。
+
+輸出每個階段重跑延遲的 p50/p95、TTS 快取命中率，以及每個 session 的記憶體增長：
+
+    python benchmarks/bench_app.py --students 8 --numbers 5
+"""
+import argparse
+import gc
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import soundfile as sf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+# 快取、音檔包與作答紀錄在 import 前就要指到隔離的位置（假的作答不能寫進真正的 attempts.db）
+_workdir = tempfile.mkdtemp(prefix="enp-bench-")
+os.environ["TTS_CACHE_DIR"] = os.path.join(_workdir, "tts")
+os.environ["TTS_PACK_PATH"] = os.path.join(_workdir, "missing-pack.bin")
+os.environ["ATTEMPT_LOG_PATH"] = os.path.join(_workdir, "attempts.db")
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+# 測試執行緒沒有 ScriptRunContext 是預期中的，不要洗版
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+import audio_cache  # noqa: E402
+import recognizers  # noqa: E402
+import tts_engine  # noqa: E402
+from jobs import JobPool  # noqa: E402
+from number_words import get_number_word, number_vocabulary  # noqa: E402
+from recognition import process_audio  # noqa: E402
+
+SAMPLE_RATE = 48000
+BASE_FREQUENCY = 300.0
+FREQUENCY_STEP = 10.0
+
+_run_lock = threading.Lock()
+
+
+def recording_for(number):
+    """半秒靜音 + 0.6 秒正弦波 + 半秒靜音；頻率代表學生唸的數字"""
+    frequency = BASE_FREQUENCY + FREQUENCY_STEP * number
+    t = np.arange(int(0.6 * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * frequency * t)
+    silence = np.zeros(SAMPLE_RATE // 2)
+    buffer = io.BytesIO()
+    sf.write(buffer, np.concatenate([silence, tone, silence]), SAMPLE_RATE, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+class StandInRecognizer(recognizers.RecognizerBackend):
+    """本機辨識替身：從正弦波頻率還原數字，模擬網路延遲與辨識錯誤"""
+
+    name = "google"
+    label = "Google（替身）"
+
+    def __init__(self, latency_ms, error_rate, seed=0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def recognize_alternatives(self, audio, language="en-US", vocabulary=None):
+        time.sleep(self.latency_ms / 1000)
+        samples = np.frombuffer(audio.get_raw_data(convert_width=2), dtype="<i2").astype(np.float64)
+        spectrum = np.abs(np.fft.rfft(samples))
+        frequency = np.argmax(spectrum) * audio.sample_rate / len(samples)
+        number = int(round((frequency - BASE_FREQUENCY) / FREQUENCY_STEP))
+        with self._lock:
+            if self._rng.random() < self.error_rate:
+                number += self._rng.choice([-1, 1])
+        return [get_number_word(max(number, 0))]
+
+    def recognize(self, audio, language="en-US", vocabulary=None):
+        return self.recognize_alternatives(audio, language, vocabulary)[0]
+
+
+class TTSCounter:
+    """包住 AudioCache.get，統計所有 session 的快取命中率"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        original = audio_cache.AudioCache.get
+
+        def counted_get(cache, text, lang, engine):
+            data = original(cache, text, lang, engine)
+            with self._lock:
+                if data is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return data
+
+        audio_cache.AudioCache.get = counted_get
+
+
+def install_stand_ins(tts_ms, asr_ms, error_rate):
+    def render_stand_in(word, lang="en"):
+        time.sleep(tts_ms / 1000)
+        return b"ID3" + word.encode("utf-8") * 64
+
+    tts_engine.render_gtts = render_stand_in
+    recognizers._instances["google"] = StandInRecognizer(asr_ms, error_rate)
+
+
+class Student:
+    def __init__(self, index, numbers, pool, timings, poll_seconds):
+        self.index = index
+        self.numbers = numbers
+        self.pool = pool
+        self.timings = timings
+        self.poll_seconds = poll_seconds
+        self.app = None
+        self.error = None
+
+    def run_app(self, phase, action=None):
+        with _run_lock:
+            started = time.perf_counter()
+            if action is not None:
+                action()
+            self.app.run()
+            self.timings[phase].append((time.perf_counter() - started) * 1000)
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+
+    def click(self, phase, label):
+        button = next(b for b in list(self.app.button) + list(self.app.sidebar.button) if b.label == label)
+        self.run_app(phase, button.click)
+
+    def submit_recording(self):
+        state = self.app.session_state
+        number = state.numbers_list[state.current_index]
+        job = self.pool.submit(
+            process_audio,
+            recording_for(number),
+            get_number_word(number),
+            85,
+            70,
+            "中等",
+            backend_name="google",
+            vocabulary=number_vocabulary(1, 20),
+            target_number=number,
+            number_range=(1, 20),
+            timeout=recognizers.RECOGNITION_TIMEOUT,
+        )
+
+        def inject():
+            self.app.session_state["asr_job"] = job
+            self.app.session_state["phase"] = "processing"
+
+        self.run_app("played → processing", inject)
+
+    def practice(self):
+        try:
+            self.app = AppTest.from_file(APP_PATH, default_timeout=60)
+            self.run_app("load")
+            self.click("start", "🚀 開始練習")
+            for _ in range(self.numbers):
+                self.click("ready → played", "🔊 第一步：聽老師發音")
+                self.submit_recording()
+                while self.app.session_state.phase == "processing":
+                    time.sleep(self.poll_seconds)
+                    self.run_app("processing poll")
+                labels = {b.label for b in self.app.button}
+                self.click("result → next", "➡️ 下一個數字" if "➡️ 下一個數字" in labels else "⏭️ 跳過這題")
+        except Exception as e:
+            self.error = e
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=8, help="同時練習的學生數")
+    parser.add_argument("--numbers", type=int, default=5, help="每位學生練習幾個數字")
+    parser.add_argument("--tts-ms", type=float, default=200, help="gTTS 替身的延遲")
+    parser.add_argument("--asr-ms", type=float, default=300, help="辨識替身的延遲")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="辨識替身聽錯的機率")
+    parser.add_argument("--poll", type=float, default=0.05, help="processing 階段的輪詢間隔（秒）")
+    args = parser.parse_args()
+
+    install_stand_ins(args.tts_ms, args.asr_ms, args.error_rate)
+    tts = TTSCounter()
+    pool = JobPool(max_workers=4, max_pending=64, name="bench-asr")
+    timings = defaultdict(list)
+
+    # 先跑一次讓模組載入、cache_resource 建好，不算進記憶體增長
+    warmup = Student(-1, 0, pool, defaultdict(list), args.poll)
+    warmup.practice()
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    students = [Student(i, args.numbers, pool, timings, args.poll) for i in range(args.students)]
+    threads = [threading.Thread(target=student.practice) for student in students]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pool.shutdown()
+
+    failures = [s for s in students if s.error is not None]
+    print(f"{args.students} 位學生 × {args.numbers} 個數字，總耗時 {wall:.1f} 秒，失敗 {len(failures)} 位")
+    for student in failures:
+        print(f"  學生 {student.index}: {student.error}")
+    print()
+    print(f"{'階段':<20}{'次數':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for phase in ["load", "start", "ready → played", "played → processing", "processing poll", "result → next"]:
+        values = timings[phase]
+        print(f"{phase:<22}{len(values):>6}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}")
+    print()
+    lookups = tts.hits + tts.misses
+    hit_rate = tts.hits / lookups * 100 if lookups else 0.0
+    print(f"TTS 快取：命中 {tts.hits}，未命中 {tts.misses}，命中率 {hit_rate:.1f}%")
+    print(f"記憶體增長：共 {(current - baseline) / 1024:.0f} KB，"
+          f"每個 session 約 {(current - baseline) / 1024 / max(args.students, 1):.0f} KB")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
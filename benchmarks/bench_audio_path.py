@@ -0,0 +1,79 @@
+"""
+比較錄音解碼的兩種路徑：
+
+- tempfile：舊版 process_audio 的做法，寫入暫存檔 → sr.AudioFile 讀回 → 刪除
+- memory：recognizers.audio_data_from_bytes，直接從記憶體解碼
+
+用法：
+
+    python benchmarks/bench_audio_path.py [--seconds 4] [--rounds 200]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+import speech_recognition as sr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognizers import audio_data_from_bytes  # noqa: E402
+
+
+def make_wav(seconds, sample_rate=48000):
+    """產生一段跟 st.audio_input 相同格式（16-bit PCM WAV）的測試錄音"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    samples = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def decode_via_tempfile(audio_bytes):
+    tmp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+    tmp_audio.write(audio_bytes)
+    tmp_audio.close()
+    try:
+        with sr.AudioFile(tmp_audio.name) as source:
+            return sr.Recognizer().record(source)
+    finally:
+        os.unlink(tmp_audio.name)
+
+
+def run(name, decode, audio_bytes, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        audio = decode(audio_bytes)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<10} mean {statistics.mean(timings):7.3f} ms   "
+          f"p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms")
+    return audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=4.0)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    audio_bytes = make_wav(args.seconds)
+    print(f"錄音長度 {args.seconds:.1f} 秒，{len(audio_bytes) / 1024:.0f} KB，各跑 {args.rounds} 次")
+    old = run("tempfile", decode_via_tempfile, audio_bytes, args.rounds)
+    new = run("memory", audio_data_from_bytes, audio_bytes, args.rounds)
+    assert old.get_raw_data() == new.get_raw_data(), "兩種路徑解碼結果不同"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+用本機的假 gTTS／Google 辨識伺服器測試 outbound：
+
+- coalesce：全班同時要同一個數字的老師發音，實際只送出一次請求
+- pool：連續合成不同的字，共用連線池 vs 每次開新的連線（gTTS 原本的做法）
+- retry：伺服器前幾次回 503，重試之後成功
+- breaker：伺服器掛掉時很快就斷路，冷卻後試探成功就恢復
+- asr：Google 辨識的請求也走同一層（FLAC 上傳、解析候選清單）
+
+用法：
+
+    python benchmarks/bench_outbound.py [--students 30] [--delay 0.2]
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class StandIn:
+    """假伺服器的狀態：延遲、接下來要失敗幾次、是否整個掛掉，以及收到的請求"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.delay = 0.0
+        self.fail_next = 0
+        self.down = False
+        self.requests = 0
+        self.connections = set()
+
+    def reset(self, delay=0.0):
+        with self.lock:
+            self.delay = delay
+            self.fail_next = 0
+            self.down = False
+            self.requests = 0
+            self.connections = set()
+
+
+stand_in = StandIn()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # keep-alive 連線上標頭與內容分開送會碰到 Nagle + delayed ACK 的 40 ms 延遲
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with stand_in.lock:
+            stand_in.requests += 1
+            stand_in.connections.add(self.client_address)
+            fail = stand_in.down or stand_in.fail_next > 0
+            stand_in.fail_next = max(0, stand_in.fail_next - 1)
+            delay = stand_in.delay
+        time.sleep(delay)
+        if fail:
+            self._reply(503, b"unavailable")
+        elif self.path.startswith("/tts"):
+            audio = base64.b64encode(b"ID3 stand-in mp3").decode("ascii")
+            self._reply(200, f')]}}\'\n[["wrb.fr","jQ1olc","[\\"{audio}\\"]",null,null,null,"generic"]]'.encode())
+        else:
+            result = {"result": [{"alternative": [{"transcript": "thirty"}, {"transcript": "thirteen"}], "final": True}]}
+            self._reply(200, b'{"result":[]}\n' + json.dumps(result).encode())
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_address[1]}"
+os.environ["TTS_ENDPOINT"] = base_url + "/tts"
+os.environ["ASR_ENDPOINT"] = base_url + "/recognize"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+import tts_engine  # noqa: E402
+from outbound import CircuitOpen, OutboundClient, OutboundError, clients  # noqa: E402
+from recognizers import audio_data_from_bytes, get_backend  # noqa: E402
+
+
+def bench_coalesce(students, delay):
+    print(f"== coalesce：{students} 個 session 同時要 thirty（伺服器延遲 {delay * 1000:.0f} ms）")
+    for name, render in (
+        ("各自送出", lambda: tts_engine._fetch_gtts(requests.Session(), "thirty", "en")),
+        ("single-flight", lambda: tts_engine.render_gtts("thirty")),
+    ):
+        stand_in.reset(delay)
+        barrier = threading.Barrier(students)
+
+        def student():
+            barrier.wait()
+            return render()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(students) as pool:
+            results = list(pool.map(lambda _: student(), range(students)))
+        elapsed = (time.perf_counter() - started) * 1000
+        assert len(set(results)) == 1
+        print(f"{name:<14} 上游請求 {stand_in.requests:3d} 次   總耗時 {elapsed:7.1f} ms")
+
+
+def bench_pool(words):
+    print(f"== pool：依序合成 {words} 個不同的字")
+    for name, send in (
+        ("每次新連線", lambda word: tts_engine._fetch_gtts(requests.Session(), word, "en")),
+        ("共用連線池", lambda word: tts_engine.render_gtts(word)),
+    ):
+        stand_in.reset()
+        timings = []
+        for index in range(words):
+            started = time.perf_counter()
+            send(f"{name} {index}")
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<10} mean {statistics.mean(timings):6.2f} ms   TCP 連線 {len(stand_in.connections):3d} 條")
+
+
+def bench_retry():
+    print("== retry：前兩次回 503")
+    stand_in.reset()
+    stand_in.fail_next = 2
+    client = OutboundClient("retry", backoff=0.05)
+    started = time.perf_counter()
+    audio = client.call(None, tts_engine._fetch_gtts, "retry", "en")
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"成功（{len(audio)} bytes），上游請求 {stand_in.requests} 次，耗時 {elapsed:.1f} ms，{client.stats()}")
+
+
+def bench_breaker():
+    print("== breaker：伺服器掛掉，之後恢復")
+    stand_in.reset(0.05)
+    stand_in.down = True
+    client = OutboundClient("breaker", retries=1, backoff=0.01, failure_threshold=3, reset_timeout=0.5)
+    for index in range(6):
+        started = time.perf_counter()
+        try:
+            client.call(None, tts_engine._fetch_gtts, "down", "en")
+        except CircuitOpen:
+            outcome = "斷路，直接拒絕"
+        except OutboundError:
+            outcome = "重試後失敗"
+        print(f"第 {index + 1} 次：{outcome:<10} {(time.perf_counter() - started) * 1000:6.1f} ms   {client.breaker.state}")
+    stand_in.down = False
+    time.sleep(0.5)
+    client.call(None, tts_engine._fetch_gtts, "up", "en")
+    print(f"冷卻後試探成功：{client.breaker.state}，上游請求共 {stand_in.requests} 次")
+
+
+def bench_asr():
+    print("== asr：Google 辨識走同一層")
+    stand_in.reset()
+    sample_rate = 16000
+    samples = (0.3 * np.sin(2 * np.pi * 220 * np.arange(sample_rate) / sample_rate) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(samples.tobytes())
+    audio = audio_data_from_bytes(buffer.getvalue())
+    hypotheses = get_backend("google").recognize_alternatives(audio)
+    print(f"候選 {hypotheses}，{clients['asr'].stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--words", type=int, default=50)
+    args = parser.parse_args()
+
+    bench_coalesce(args.students, args.delay)
+    bench_pool(args.words)
+    bench_retry()
+    bench_breaker()
+    bench_asr()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+每次互動的畫面重跑成本
+
+以 AppTest 驅動 app.py，逐一量測小朋友每個操作讓伺服器重跑了多少腳本：
+腳本執行時間（從 SCRIPT_STARTED 到結束，一個操作觸發多次重跑就加總）、
+送到瀏覽器的訊息數與位元組數。
+
+AppTest 本身每次都重跑整個腳本；加上 --scope fragment 時，練習區裡的操作
+改成像瀏覽器一樣只要求重跑練習區的 fragment，用來比較整頁重跑與 fragment
+重跑的差別。要量改版前的數字，可以用 --app 指向舊版的 app.py：
+
+    python benchmarks/bench_render.py --scope app
+    python benchmarks/bench_render.py --scope fragment
+    git show <舊版>:app.py > /tmp/app_before.py
+    python benchmarks/bench_render.py --app /tmp/app_before.py
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from urllib import parse
+
+import numpy as np
+
+from bench_app import APP_PATH, install_stand_ins, recording_for  # 也會把快取指到隔離的暫存目錄
+
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests  # noqa: E402
+from streamlit.testing.v1 import app_test  # noqa: E402
+from streamlit.testing.v1.app_test import AppTest  # noqa: E402
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas  # noqa: E402
+from streamlit.testing.v1.element_tree import parse_tree_from_messages  # noqa: E402
+
+from jobs import JobPool  # noqa: E402
+from number_words import get_number_word, number_vocabulary  # noqa: E402
+from recognition import process_audio  # noqa: E402
+
+SCRIPT_CACHE = ScriptCache()
+
+STOPPED_EVENTS = {
+    "SCRIPT_STOPPED_WITH_COMPILE_ERROR",
+    "SCRIPT_STOPPED_WITH_SUCCESS",
+    "SCRIPT_STOPPED_FOR_RERUN",
+    "FRAGMENT_STOPPED_WITH_SUCCESS",
+}
+
+
+class MeasuredRunner(LocalScriptRunner):
+    """記錄腳本執行時間與送出的訊息；fragment_ids 有值時只重跑那些 fragment"""
+
+    fragment_ids = None
+    last = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # AppTest 每次都新建 ScriptCache，會重新編譯 app.py；真正的伺服器只編譯一次
+        self._script_cache = SCRIPT_CACHE
+        self.script_seconds = 0.0
+        self.messages = 0
+        self.message_bytes = 0
+        self._started = None
+        self.on_event.connect(self._measure, weak=False)
+        MeasuredRunner.last = self
+
+    def _measure(self, sender, event, **kwargs):
+        if event.name == "SCRIPT_STARTED":
+            self._started = time.perf_counter()
+        elif event.name in STOPPED_EVENTS and self._started is not None:
+            self.script_seconds += time.perf_counter() - self._started
+            self._started = None
+        elif event.name == "ENQUEUE_FORWARD_MSG":
+            self.messages += 1
+            self.message_bytes += kwargs["forward_msg"].ByteSize()
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        query_string = parse.urlencode(query_params, doseq=True) if query_params else ""
+        rerun_data = RerunData(
+            widget_states=widget_state,
+            query_string=query_string,
+            page_script_hash=page_hash,
+            fragment_id_queue=list(MeasuredRunner.fragment_ids or []),
+        )
+        # 建構時已經排了一個整頁重跑的請求，會把 fragment 的請求合併成整頁重跑，
+        # 所以換成只有這一個請求的佇列
+        self._requests = ScriptRequests()
+        self._requests.request_rerun(rerun_data)
+        try:
+            if not self._script_thread:
+                self.start()
+            require_widgets_deltas(self, timeout)
+        finally:
+            self.join()
+        return parse_tree_from_messages(self.forward_msgs())
+
+
+app_test.LocalScriptRunner = MeasuredRunner
+
+
+class Session:
+    def __init__(self, app_path, scope, pool):
+        self.app = AppTest.from_file(app_path, default_timeout=60)
+        self.scope = scope
+        self.pool = pool
+        self.results = defaultdict(list)
+
+    def practice_fragment(self):
+        """目前登記的最外層 fragment（練習區）；舊版沒有 fragment 時是 None"""
+        storage = self.app._fragment_storage
+        top_level = [fid for fid, parent in storage._parent_by_id.items() if parent is None]
+        return top_level[0] if top_level else None
+
+    def run(self, action=None, in_practice_area=True):
+        """執行一次（AppTest 的一次 run，可能包含多次內部重跑），回傳 [腳本 ms, 訊息數, 位元組]"""
+        fragment_id = self.practice_fragment() if in_practice_area and self.scope == "fragment" else None
+        MeasuredRunner.fragment_ids = [fragment_id] if fragment_id else None
+        if action is not None:
+            action()
+        self.app.run()
+        MeasuredRunner.fragment_ids = None
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+        runner = MeasuredRunner.last
+        return np.array([runner.script_seconds * 1000, runner.messages, runner.message_bytes])
+
+    def click(self, interaction, label, in_practice_area=True):
+        buttons = list(self.app.button) + list(self.app.sidebar.button)
+        button = next(b for b in buttons if b.label == label)
+        self.results[interaction].append(self.run(button.click, in_practice_area))
+
+    def record(self, number):
+        state = self.app.session_state
+        target = state.numbers_list[state.current_index]
+        job = self.pool.submit(
+            process_audio, recording_for(number), get_number_word(target), 85, 70, "中等",
+            backend_name="google", vocabulary=number_vocabulary(1, 20),
+            target_number=target, number_range=(1, 20),
+        )
+        job.future.result()
+
+        def inject():
+            self.app.session_state["asr_job"] = job
+            self.app.session_state["phase"] = "processing"
+
+        # 錄音元件在練習區裡，錄完只會重跑練習區；辨識完成後整頁重跑一次
+        total = self.run(inject)
+        while self.app.session_state.phase == "processing":
+            total += self.run(in_practice_area=False)
+        self.results["錄音送出 → 結果"].append(total)
+
+    def practice(self, numbers):
+        self.results["載入"].append(self.run(in_practice_area=False))
+        self.click("開始練習", "🚀 開始練習", in_practice_area=False)
+        for _ in range(numbers):
+            target = self.app.session_state.numbers_list[self.app.session_state.current_index]
+            self.click("聽老師發音", "🔊 第一步：聽老師發音")
+            self.record(target + 1)
+            self.click("再試一次", "🔄 再試一次")
+            self.click("聽老師發音", "🔊 第一步：聽老師發音")
+            self.record(target)
+            self.click("下一個數字", "➡️ 下一個數字")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=APP_PATH, help="要量測的 app.py")
+    parser.add_argument("--scope", choices=["app", "fragment"], default="fragment",
+                        help="練習區的操作要整頁重跑還是只重跑 fragment")
+    parser.add_argument("--numbers", type=int, default=5, help="練習幾個數字")
+    args = parser.parse_args()
+
+    install_stand_ins(tts_ms=0, asr_ms=0, error_rate=0.0)
+    pool = JobPool(max_workers=1, max_pending=4, name="bench-render")
+    # 先跑一輪暖機（import、cache_resource、lru_cache）
+    Session(args.app, args.scope, pool).practice(1)
+    session = Session(args.app, args.scope, pool)
+    session.practice(args.numbers)
+    pool.shutdown()
+
+    print(f"{os.path.relpath(args.app)}，scope={args.scope}，{args.numbers} 個數字")
+    print(f"{'操作':<14}{'次數':>6}{'腳本 p50 ms':>14}{'腳本 p95 ms':>14}{'訊息數':>8}{'KB':>8}")
+    for interaction in ["載入", "開始練習", "聽老師發音", "錄音送出 → 結果", "再試一次", "下一個數字"]:
+        rows = session.results[interaction]
+        if not rows:
+            continue
+        script_ms = [row[0] for row in rows]
+        print(
+            f"{interaction:<16}{len(rows):>6}"
+            f"{np.percentile(script_ms, 50):>14.1f}{np.percentile(script_ms, 95):>14.1f}"
+            f"{np.mean([row[1] for row in rows]):>8.0f}{np.mean([row[2] for row in rows]) / 1024:>8.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
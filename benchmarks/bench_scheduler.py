@@ -0,0 +1,108 @@
+"""
+闖關模式出題順序（WeaknessScheduler）的檢查與微基準測試
+
+先確認出題順序該有的性質，再量出題與評分的速度：
+
+- 全對：每一輪 10 題都是不同的數字（答對過的數字不會排在新數字前面），
+  同一個範圍連續練好幾輪也一樣
+- 有一題一直答錯：那個數字這一輪會多練幾次，下一輪一開始先出
+- 全錯：卡住的數字練幾次之後，還是會換新的數字
+
+用法：
+
+    python benchmarks/bench_scheduler.py [--seeds 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import WeaknessScheduler  # noqa: E402
+
+CHALLENGE_LENGTH = 10
+RANGES = [(1, 20), (1, 100), (1, 10 ** 9)]
+
+
+def play(scheduler, answer, rounds):
+    """照 app.py 的方式出題：每輪先 start_round，不讓同一個數字連續出現；回傳每一輪的題目"""
+    played = []
+    for _ in range(rounds):
+        scheduler.start_round()
+        questions = []
+        for _ in range(CHALLENGE_LENGTH):
+            number = scheduler.next_number(exclude=questions[-1] if questions else None)
+            scheduler.record(number, answer(number, played, questions))
+            questions.append(number)
+        played.append(questions)
+    return played
+
+
+def all_correct(number, played, questions):
+    return 100
+
+
+def first_wrong(number, played, questions):
+    """第一輪的第一題一直唸錯，其他都對"""
+    first = played[0][0] if played else (questions[0] if questions else number)
+    return 0 if number == first else 100
+
+
+def all_wrong(number, played, questions):
+    return 0
+
+
+def check_all_correct(seeds, rounds):
+    for start, end in RANGES:
+        for seed in range(seeds):
+            scheduler = WeaknessScheduler(start, end, rng=random.Random(seed))
+            for questions in play(scheduler, all_correct, rounds):
+                assert len(set(questions)) == CHALLENGE_LENGTH, (start, end, seed, questions)
+    print(f"全對：{len(RANGES)} 個範圍 × {seeds} 個種子 × {rounds} 輪，每輪 {CHALLENGE_LENGTH} 題都不同")
+
+
+def describe(name, answer, seeds):
+    repeats = 0
+    leads = 0
+    distinct = 0
+    for seed in range(seeds):
+        played = play(WeaknessScheduler(1, 100, rng=random.Random(seed)), answer, 2)
+        repeats += played[0].count(played[0][0])
+        leads += played[1][0] == played[0][0]
+        distinct += len(set(played[0]))
+    print(
+        f"{name:<8} 第一題在第一輪出現 {repeats / seeds:.1f} 次，"
+        f"下一輪先出 {leads / seeds * 100:.0f}%，第一輪不同的數字 {distinct / seeds:.1f} 個"
+    )
+
+
+def time_it(end, questions):
+    scheduler = WeaknessScheduler(1, end, rng=random.Random(0))
+    scheduler.start_round()
+    rng = random.Random(1)
+    previous = None
+    started = time.perf_counter()
+    for _ in range(questions):
+        previous = scheduler.next_number(exclude=previous)
+        scheduler.record(previous, rng.choice((0, 50, 100)))
+    return (time.perf_counter() - started) / questions * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=20000)
+    args = parser.parse_args()
+
+    check_all_correct(args.seeds, args.rounds)
+    describe("一題一直錯", first_wrong, args.seeds)
+    describe("全錯", all_wrong, args.seeds)
+    for start, end in RANGES:
+        print(f"{start}～{end:,}：出題 + 評分 {time_it(end, args.questions):5.1f} µs/題")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+calculate_score 微基準測試
+
+把舊版 calculate_score（每次呼叫都重建變體表、逐一子字串搜尋）原封不動
+保留在這裡，先確認新版在所有測試輸入與三種容錯等級下分數完全相同，
+再比較兩者的速度。
+
+用法：
+
+    python benchmarks/bench_scoring.py [--rounds 20]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+from rapidfuzz import fuzz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from number_words import get_number_word  # noqa: E402
+from scoring import CHILD_PRONUNCIATION_MAP, calculate_score  # noqa: E402
+
+TOLERANCE_LEVELS = ["嚴格", "中等", "寬鬆"]
+
+
+def legacy_normalize_text(text):
+    text = text.lower()
+    text = re.sub(r"[-]", " ", text)
+    text = re.sub(r"[^a-z0-9 ]", "", text)
+    return text.strip()
+
+
+def legacy_calculate_score(target, result, tolerance_level="中等"):
+    target = legacy_normalize_text(target)
+    result = legacy_normalize_text(result)
+
+    child_pronunciation_map = {
+        "three": ["tree", "free", "sree"],
+        "thirteen": ["thirty", "thurteen", "firteen"],
+        "thirty": ["thirteen", "thirsty", "turty"],
+        "five": ["fibe", "fife"],
+        "seven": ["seben", "sebun"],
+        "eleven": ["eleben", "levin"],
+        "twelve": ["twelb", "twelf"],
+        "twenty": ["twenny", "twunty"],
+        "fifty": ["fity", "fifthy"],
+        "sixty": ["sickty", "sikty"],
+        "seventy": ["sebenty", "sevunty"],
+        "eighty": ["eity", "eitty"],
+        "ninety": ["ninty", "ninity"],
+    }
+
+    if tolerance_level == "寬鬆":
+        target_words = target.split()
+        result_words = result.split()
+
+        for target_word in target_words:
+            if target_word in result_words:
+                return 100
+            if target_word in child_pronunciation_map:
+                for similar in child_pronunciation_map[target_word]:
+                    if similar in result:
+                        return 95
+
+        matches = sum(1 for word in target_words if word in result)
+        if matches > 0:
+            return 80 + (matches * 5)
+
+        base_score = fuzz.ratio(target, result)
+        return min(100, base_score + 15)
+
+    elif tolerance_level == "中等":
+        target_words = target.split()
+        matches = sum(1 for word in target_words if word in result)
+
+        tolerance_bonus = 0
+        for target_word in target_words:
+            if target_word in child_pronunciation_map:
+                for similar in child_pronunciation_map[target_word]:
+                    if similar in result:
+                        tolerance_bonus += 10
+                        break
+
+        base_score = fuzz.ratio(target, result)
+        bonus = matches * 10
+        return min(100, base_score + bonus + tolerance_bonus)
+
+    else:
+        target_words = target.split()
+        matches = sum(1 for word in target_words if word in result)
+        base_score = fuzz.ratio(target, result)
+        bonus = matches * 5
+        return min(100, base_score + bonus)
+
+
+def make_cases(seed=0):
+    """每個目標數字搭配：正確答案、數字、兒童變體、相近數字、隨機雜訊"""
+    rng = random.Random(seed)
+    words = [get_number_word(n) for n in range(1, 101)]
+    variants = [v for vs in CHILD_PRONUNCIATION_MAP.values() for v in vs]
+    cases = []
+    for number, target in enumerate(words, start=1):
+        results = [
+            target,
+            target.replace(" ", "-").title(),
+            str(number),
+            f"I said {target}!",
+            rng.choice(words),
+            rng.choice(words) + " " + rng.choice(words),
+            " ".join(rng.sample(variants, 2)),
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(rng.randint(0, 20))),
+            "",
+        ]
+        for word in target.split():
+            for variant in CHILD_PRONUNCIATION_MAP.get(word, []):
+                results.append(target.replace(word, variant))
+        cases.extend((target, result) for result in results)
+    return cases
+
+
+def time_it(score, cases, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for level in TOLERANCE_LEVELS:
+            for target, result in cases:
+                score(target, result, level)
+    calls = rounds * len(TOLERANCE_LEVELS) * len(cases)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = make_cases()
+    for level in TOLERANCE_LEVELS:
+        for target, result in cases:
+            expected = legacy_calculate_score(target, result, level)
+            actual = calculate_score(target, result, level)
+            assert expected == actual, (level, target, result, expected, actual)
+    print(f"{len(cases) * len(TOLERANCE_LEVELS)} 組輸入分數完全相同")
+
+    legacy = time_it(legacy_calculate_score, cases, args.rounds)
+    current = time_it(calculate_score, cases, args.rounds)
+    print(f"舊版 {legacy:6.2f} µs/次   新版 {current:6.2f} µs/次   加速 {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
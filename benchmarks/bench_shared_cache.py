@@ -0,0 +1,145 @@
+"""
+模擬負載平衡後面的多個行程：同一台主機先後開兩個全新的行程（冷、暖），
+比較各種 CACHE_BACKEND 下暖機要花多少時間：
+
+- index：build_reverse_index(1, N)
+- words：get_number_word(1～2000)
+- 整個行程還需不需要 import num2words
+- tts：20 個字的老師發音（gTTS 以 50 ms 的假合成代替）
+
+network 模式會在本機開一個假的 HTTP 鍵值儲存。
+
+用法：
+
+    python benchmarks/bench_shared_cache.py [--span 2000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker(span):
+    sys.path.insert(0, ROOT)
+    timings = {}
+
+    started = time.perf_counter()
+    from scoring import build_reverse_index
+    build_reverse_index(1, span)
+    timings["index"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from number_words import get_number_word
+    for number in range(1, 2001):
+        get_number_word(number)
+    timings["words"] = time.perf_counter() - started
+
+    from audio_cache import AudioCache, SharedAudioCache
+    from cache_backends import shared_backend
+
+    def render(word):
+        time.sleep(0.05)
+        return b"ID3" + word.encode()
+
+    backend = shared_backend()
+    cache = SharedAudioCache(backend) if backend is not None else AudioCache(os.environ["TTS_CACHE_DIR"])
+    started = time.perf_counter()
+    for number in range(1, 21):
+        word = get_number_word(number)
+        cache.get_or_create(word, "en", "gtts", lambda: render(word))
+    timings["tts"] = time.perf_counter() - started
+
+    print(json.dumps({
+        "timings": timings,
+        # 整個行程有沒有用到 num2words（共用儲存都命中時不必 import）
+        "num2words": "num2words" in sys.modules,
+        "stats": backend.stats() if backend is not None else None,
+    }))
+
+
+class KeyValueHandler(BaseHTTPRequestHandler):
+    """假的網路儲存：GET／HEAD 找不到回 404，PUT 寫入"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    store = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        value = self.store.get(self.path)
+        if value is None:
+            self._reply(404, b"")
+        else:
+            self._reply(200, value)
+
+    def do_HEAD(self):
+        value = self.store.get(self.path)
+        self.send_response(404 if value is None else 200)
+        self.send_header("Content-Length", "0" if value is None else str(len(value)))
+        self.end_headers()
+
+    def do_PUT(self):
+        self.store[self.path] = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(204, b"")
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run_process(env, span):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", "--span", str(span)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--span", type=int, default=2000)
+    parser.add_argument("--worker", action="store_true")
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.span)
+        return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeyValueHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    workdir = tempfile.mkdtemp()
+
+    print(f"{'backend':<10}{'行程':<6}{'index':>10}{'words':>10}{'tts':>10}  num2words  命中率")
+    for kind in ("", "sqlite", "network"):
+        env = dict(os.environ, CACHE_BACKEND=kind, TTS_CACHE_DIR=os.path.join(workdir, f"tts-{kind or 'none'}"))
+        env["CACHE_PATH"] = os.path.join(workdir, "cache.db")
+        env["CACHE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/cache"
+        for label in ("冷", "暖"):
+            result = run_process(env, args.span)
+            timings = result["timings"]
+            rates = ""
+            if result["stats"]:
+                rates = " ".join(
+                    f"{namespace.split(':')[0]} {counts['hit_rate'] * 100:.0f}%"
+                    for namespace, counts in sorted(result["stats"]["namespaces"].items())
+                )
+            print(
+                f"{kind or '(無)':<10}{label:<6}"
+                f"{timings['index'] * 1000:8.0f}ms{timings['words'] * 1000:8.0f}ms{timings['tts'] * 1000:8.0f}ms"
+                f"  {'要' if result['num2words'] else '不用':<8}  {rates}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+冷啟動時間基準測試
+
+每一輪都開一個全新的 Python 行程（就像自動擴充剛起來的容器），量測：
+
+- import：streamlit 與 AppTest 載入完成的時間（兩個版本都一樣，當作基準）
+- 首次畫面：第一次執行 app.py（含 app 自己的 import）直到畫面送出
+- 開始練習：按下「開始練習」後第一個數字的畫面
+- 以及首次畫面後已經載入了哪些重量級套件
+
+比較改版前後時，可以用 --root 指向舊版的工作目錄：
+
+    git worktree add /tmp/app-before <舊版>
+    python benchmarks/bench_startup.py --root /tmp/app-before
+    python benchmarks/bench_startup.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["gtts", "speech_recognition", "num2words", "rapidfuzz", "numpy", "soundfile"]
+
+CHILD = r"""
+import json, os, sys, time
+started = time.perf_counter()
+root = sys.argv[1]
+sys.path.insert(0, root)
+import logging
+from streamlit.testing.v1 import AppTest
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+imported = time.perf_counter()
+
+at = AppTest.from_file(os.path.join(root, "app.py"), default_timeout=60).run()
+first_render = time.perf_counter()
+loaded = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+
+next(b for b in at.sidebar.button if b.label == "🚀 開始練習").click().run()
+started_practice = time.perf_counter()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_render_ms": (first_render - imported) * 1000,
+    "start_ms": (started_practice - first_render) * 1000,
+    "loaded": loaded,
+}))
+"""
+
+
+def measure_once(root):
+    env = dict(os.environ)
+    # 每次都用空的快取目錄，不讓上一輪的結果影響冷啟動
+    env["TTS_CACHE_DIR"] = tempfile.mkdtemp(prefix="enp-startup-")
+    env["TTS_PACK_PATH"] = os.path.join(env["TTS_CACHE_DIR"], "missing-pack.bin")
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, root, json.dumps(HEAVY_MODULES)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=ROOT, help="要量測的專案目錄")
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    runs = [measure_once(os.path.abspath(args.root)) for _ in range(args.rounds)]
+    print(f"{args.root}，{args.rounds} 輪（每輪都是新的行程）")
+    for key, label in [("import_ms", "import streamlit"), ("first_render_ms", "首次畫面"),
+                       ("start_ms", "開始練習")]:
+        values = [run[key] for run in runs]
+        print(f"  {label:<18}中位數 {np.median(values):7.1f} ms   最小 {min(values):7.1f} ms")
+    print(f"  首次畫面後已載入：{', '.join(runs[-1]['loaded']) or '（無）'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+跨行程共用的快取儲存
+
+多個 Streamlit 行程放在負載平衡後面時，每個行程各自的 lru_cache 與
+st.cache_resource 都要重新暖機：單字要重新 import num2words 轉換、
+1～2000 的反查表要重新建一次（約半秒）。這裡提供一個共用的鍵值儲存，
+TTS 音檔、單字與評分反查表都先查它，查不到才自己算，算完再放回去。
+
+以環境變數選擇（預設不啟用，維持每個行程各自快取）：
+
+    CACHE_BACKEND=memory    只在本行程（測試用）
+    CACHE_BACKEND=sqlite    同一台主機的行程共用 CACHE_PATH 這個 SQLite 檔案
+    CACHE_BACKEND=network   透過 HTTP 存取 CACHE_URL（GET/HEAD/PUT {CACHE_URL}/{namespace}/{key}）
+
+SQLite 使用 WAL：讀取不會被寫入擋住，每個執行緒有自己的唯讀連線，
+讀取路徑不經過任何 Python 鎖。網路儲存走 outbound 的 client，
+連不上時很快就斷路，當成沒有命中。儲存出錯一律當成沒有命中，不影響練習。
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "english-number-practice-cache.db")
+DEFAULT_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# 每寫入這麼多次才檢查一次總容量（SUM(length(value)) 要掃過整張表）
+EVICTION_CHECK_INTERVAL = 64
+
+
+class CacheBackend:
+    """
+    快取儲存的共用介面：鍵是 (namespace, key) 字串、值是 bytes。
+    子類別實作 _get、_put（與選用的 _contains、_size），這裡負責各 namespace 的命中統計
+    """
+
+    name = ""
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._counts = {}
+
+    def _count(self, namespace, event):
+        with self._stats_lock:
+            counts = self._counts.setdefault(namespace, {"hits": 0, "misses": 0, "puts": 0, "errors": 0})
+            counts[event] += 1
+
+    def get(self, namespace, key):
+        try:
+            value = self._get(namespace, key)
+        except Exception:
+            self._count(namespace, "errors")
+            value = None
+        self._count(namespace, "hits" if value is not None else "misses")
+        return value
+
+    def contains(self, namespace, key):
+        """只看有沒有，不算進命中統計（例如預先合成用來跳過已經有的）"""
+        try:
+            return self._contains(namespace, key)
+        except Exception:
+            return False
+
+    def put(self, namespace, key, value):
+        try:
+            self._put(namespace, key, bytes(value))
+        except Exception:
+            self._count(namespace, "errors")
+            return
+        self._count(namespace, "puts")
+
+    def get_or_create(self, namespace, key, create):
+        """命中就直接回傳，否則呼叫 create() 產生值並寫回共用儲存"""
+        value = self.get(namespace, key)
+        if value is None:
+            value = create()
+            self.put(namespace, key, value)
+        return value
+
+    def size(self, namespace):
+        """(項目數, 位元組數)；儲存不支援或出錯時是 (0, 0)"""
+        try:
+            return self._size(namespace)
+        except Exception:
+            return 0, 0
+
+    def _get(self, namespace, key):
+        raise NotImplementedError
+
+    def _put(self, namespace, key, value):
+        raise NotImplementedError
+
+    def _contains(self, namespace, key):
+        return self._get(namespace, key) is not None
+
+    def _size(self, namespace):
+        return 0, 0
+
+    def stats(self):
+        """每個 namespace 的命中次數與命中率"""
+        with self._stats_lock:
+            namespaces = {namespace: dict(counts) for namespace, counts in self._counts.items()}
+        for counts in namespaces.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = counts["hits"] / lookups if lookups else 0.0
+        return {"backend": self.name, "namespaces": namespaces}
+
+
+class MemoryBackend(CacheBackend):
+    """只在本行程的 LRU（沒有其他行程時，或測試用）"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def _get(self, namespace, key):
+        with self._lock:
+            value = self._entries.get((namespace, key))
+            if value is not None:
+                self._entries.move_to_end((namespace, key))
+            return value
+
+    def _put(self, namespace, key, value):
+        with self._lock:
+            previous = self._entries.pop((namespace, key), None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[namespace, key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _size(self, namespace):
+        with self._lock:
+            sizes = [len(value) for (entry_namespace, _), value in self._entries.items() if entry_namespace == namespace]
+        return len(sizes), sum(sizes)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    同一台主機上所有行程共用的 SQLite 檔案（WAL）。讀取用每個執行緒自己的
+    唯讀連線；寫入在本行程內排隊，跨行程則交給 SQLite 的鎖與 busy_timeout。
+    超過容量上限時先刪最早寫入的項目（讀取不更新時間，才不會讓讀也變成寫）
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writes = 0
+        self._writer = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        with self._writer:
+            self._writer.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    stored_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            self._writer.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)")
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    def _get(self, namespace, key):
+        row = self._reader().execute(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _contains(self, namespace, key):
+        return self._reader().execute(
+            "SELECT 1 FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone() is not None
+
+    def _put(self, namespace, key, value):
+        with self._write_lock:
+            with self._writer:
+                self._writer.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, value, time.time()),
+                )
+            self._writes += 1
+            if self._writes % EVICTION_CHECK_INTERVAL == 0 or len(value) > self.max_bytes // 100:
+                self._evict()
+
+    def _evict(self):
+        total = self._writer.execute("SELECT COALESCE(SUM(length(value)), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed = []
+        for rowid, size in self._writer.execute("SELECT rowid, length(value) FROM cache ORDER BY stored_at"):
+            if excess <= 0:
+                break
+            doomed.append((rowid,))
+            excess -= size
+        with self._writer:
+            self._writer.executemany("DELETE FROM cache WHERE rowid = ?", doomed)
+
+    def _size(self, namespace):
+        return self._reader().execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(value)), 0) FROM cache WHERE namespace = ?", (namespace,)
+        ).fetchone()
+
+
+class NetworkBackend(CacheBackend):
+    """
+    HTTP 鍵值儲存：GET 回 200（值）或 404（沒有），HEAD 只問有沒有，PUT 寫入。
+    請求經過 outbound 的 client（連線池、斷路），逾時很短，儲存掛掉時只是全部沒命中
+    """
+
+    name = "network"
+
+    def __init__(self, base_url, timeout=1.0):
+        super().__init__()
+        from outbound import OutboundClient
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.client = OutboundClient("cache", max_concurrency=8, queue_timeout=timeout, retries=1, backoff=0.05)
+
+    def _url(self, namespace, key):
+        return f"{self.base_url}/{quote(namespace, safe='')}/{quote(key, safe='')}"
+
+    def _fetch(self, session, url):
+        response = session.get(url, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.content
+
+    def _exists(self, session, url):
+        # HEAD 不下載內容：預先合成每次重跑都要問好幾個音檔在不在
+        response = session.head(url, timeout=self.timeout)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def _store(self, session, url, value):
+        session.put(url, data=value, timeout=self.timeout).raise_for_status()
+
+    def _get(self, namespace, key):
+        url = self._url(namespace, key)
+        return self.client.call(("get", url), self._fetch, url)
+
+    def _contains(self, namespace, key):
+        url = self._url(namespace, key)
+        return self.client.call(("head", url), self._exists, url)
+
+    def _put(self, namespace, key, value):
+        self.client.call(None, self._store, self._url(namespace, key), value)
+
+
+def make_backend(kind, path=None, url=None):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or DEFAULT_CACHE_PATH)
+    if kind == "network":
+        if not url:
+            raise ValueError("CACHE_BACKEND=network 需要設定 CACHE_URL")
+        return NetworkBackend(url)
+    raise ValueError(f"不認得的 CACHE_BACKEND：{kind}")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_backend():
+    """環境變數設定的共用儲存（整個行程一個）；沒有設定 CACHE_BACKEND 時是 None"""
+    global _shared
+    kind = os.environ.get("CACHE_BACKEND", "")
+    if not kind:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = make_backend(kind, os.environ.get("CACHE_PATH"), os.environ.get("CACHE_URL"))
+        return _shared
@@ -0,0 +1,70 @@
+"""
+背景工作池
+
+所有 session 共用一個有上限的執行緒池。送出工作後拿到一個 Job，
+存在 session_state 裡，畫面每隔一段時間檢查工作是否完成，
+Streamlit 的腳本執行緒不會被長時間的網路呼叫卡住。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobPoolFull(RuntimeError):
+    """等待中的工作已達上限"""
+
+
+class Job:
+    """背景工作的控制代碼，可以查詢狀態、判斷逾時與取消"""
+
+    def __init__(self, future, timeout=None):
+        self.future = future
+        self.timeout = timeout
+        self.submitted_at = time.monotonic()
+        self.cancelled = False
+
+    def elapsed(self):
+        return time.monotonic() - self.submitted_at
+
+    def done(self):
+        return not self.cancelled and self.future.done()
+
+    def expired(self):
+        return self.timeout is not None and not self.future.done() and self.elapsed() > self.timeout
+
+    def cancel(self):
+        """還沒開始的工作會直接取消；已經在跑的工作則忽略它的結果"""
+        self.cancelled = True
+        self.future.cancel()
+
+    def result(self):
+        return self.future.result()
+
+
+class JobPool:
+    """有上限的執行緒池：最多 max_workers 個同時執行、max_pending 個排隊中"""
+
+    def __init__(self, max_workers=4, max_pending=32, name="job"):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+
+    def submit(self, fn, *args, timeout=None, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise JobPoolFull(f"背景工作已達上限（{self.max_pending}）")
+        with self._lock:
+            self.pending += 1
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return Job(future, timeout=timeout)
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
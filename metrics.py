@@ -0,0 +1,210 @@
+"""
+效能指標
+
+在 generate_tts、process_audio、評分與每個畫面階段外面包上計時，
+記錄計數器與延遲直方圖，找出到底是 gTTS、辨識、評分還是畫面重跑比較慢。
+
+預設關閉，關閉時 timed() 只回傳一個共用的空物件，幾乎沒有額外成本。
+以環境變數開啟：
+
+    METRICS_ENABLED=1          開啟紀錄
+    METRICS_JSONL=metrics.jsonl  每筆事件附加寫入的 JSONL 檔（設成空字串則不寫檔）
+    METRICS_PORT=9464          在本機開一個 Prometheus 文字格式的 /metrics 端點
+"""
+import json
+import os
+import threading
+import time
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes", "on")
+
+
+class _DiscardLabels(dict):
+    """關閉時 timed() 交出去的標籤容器，寫入什麼都直接丟掉"""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+class _NullTimer:
+    _labels = _DiscardLabels()
+
+    def __enter__(self):
+        return self._labels
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+        self._name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self.labels
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        self._metrics.observe(self._name, elapsed_ms, **self.labels)
+        return False
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    inner = ",".join('{}="{}"'.format(key, value.replace('"', '\\"')) for key, value in pairs)
+    return "{" + inner + "}"
+
+
+class Metrics:
+    def __init__(self, enabled=False, jsonl_path=None):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._jsonl = None
+        self._server = None
+
+    def timed(self, name, **labels):
+        """
+        計時區塊；with 區塊內可以補上標籤：
+
+            with metrics.timed("tts") as labels:
+                labels["source"] = "cache"
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._write({"type": "counter", "name": name, "value": amount, "labels": labels})
+
+    def observe(self, name, value_ms, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value_ms)
+        self._write({"type": "timing", "name": name, "value": round(value_ms, 3), "labels": labels})
+
+    def _write(self, event):
+        if not self.jsonl_path:
+            return
+        event["ts"] = time.time()
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._jsonl is None:
+                self._jsonl = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+            self._jsonl.write(line)
+
+    def snapshot(self):
+        """目前所有計數器與直方圖（給畫面顯示用）"""
+        with self._lock:
+            counters = {
+                (name, labels): value for (name, labels), value in self._counters.items()
+            }
+            histograms = {
+                (name, labels): (h.count, h.total, list(h.counts))
+                for (name, labels), h in self._histograms.items()
+            }
+        return counters, histograms
+
+    def prometheus_text(self):
+        counters, histograms = self.snapshot()
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name}_total counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}_total{_format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name}_ms histogram")
+            for (histogram_name, labels), (count, total, bucket_counts) in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(list(BUCKETS_MS) + ["+Inf"], bucket_counts):
+                    cumulative += bucket_count
+                    bucket_labels = labels + (("le", str(bound)),)
+                    lines.append(f"{name}_ms_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_ms_sum{_format_labels(labels)} {total:.3f}")
+                lines.append(f"{name}_ms_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """在背景執行緒開 /metrics 端點；同一個行程只會開一次"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        with self._lock:
+            if self._server is not None:
+                return self._server
+            metrics = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics.prometheus_text().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            return self._server
+
+
+metrics = Metrics(
+    enabled=_env_flag("METRICS_ENABLED"),
+    jsonl_path=os.environ.get("METRICS_JSONL", "metrics.jsonl"),
+)
+
+if metrics.enabled and os.environ.get("METRICS_PORT"):
+    metrics.start_http_server(int(os.environ["METRICS_PORT"]))
@@ -0,0 +1,174 @@
+"""
+數字與英文單字的轉換
+
+設定了 CACHE_BACKEND 時，轉換結果也放在跨行程的共用儲存（cache_backends.py），
+新開的行程查得到就不必 import num2words。
+"""
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from cache_backends import shared_backend
+
+# 練習範圍可以到十億，只留最近用過的單字（進度、評分、語音每次重跑都會查同一個數字）
+NUMBER_WORD_CACHE_SIZE = 4096
+# 設定了共用儲存時，單字以這麼多個數字為一塊讀寫；本行程最多留幾塊
+SHARED_BLOCK_SIZE = 256
+SHARED_BLOCK_CACHE_SIZE = 64
+# 只有這以下的數字放進共用儲存；到十億的隨機題幾乎不會重複，各自算比較快
+SHARED_WORDS_LIMIT = 100000
+# 範圍比這個大時不逐一展開，英文數字用到的單字本來就只有固定幾十個
+VOCABULARY_SCAN_LIMIT = 2000
+SCALES = [(10 ** 9, "billion"), (10 ** 6, "million"), (10 ** 3, "thousand")]
+# 這個範圍的數字也接受年份的唸法（2024 → twenty twenty four）
+YEAR_RANGE = (1000, 2999)
+
+
+@lru_cache(maxsize=1)
+def num2words_version():
+    """共用儲存的 namespace 帶上 num2words 的版本，升級後不會讀到舊的寫法"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("num2words")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _render_number_word(number):
+    # num2words 載入時會註冊所有語言，第一次轉換時才 import
+    from num2words import num2words
+
+    return num2words(number).replace("-", " ")
+
+
+def _render_readings(number, word):
+    readings = [word]
+    if YEAR_RANGE[0] <= number <= YEAR_RANGE[1]:
+        from num2words import num2words
+
+        year = num2words(number, to="year").replace("-", " ")
+        if year != word:
+            readings.append(year)
+    return readings
+
+
+def _render_block(block):
+    """
+    共用儲存以 SHARED_BLOCK_SIZE 個數字為一塊：每個數字的 [寫法, [唸法…]]。
+    逐一數字存取時，建 1～2000 的反查表要讀寫四千次，網路儲存反而比自己算還慢
+    """
+    entries = []
+    for number in range(block * SHARED_BLOCK_SIZE, (block + 1) * SHARED_BLOCK_SIZE):
+        word = _render_number_word(number)
+        entries.append([word, _render_readings(number, word)])
+    return entries
+
+
+_blocks = OrderedDict()  # 本行程最近用過的幾塊
+_pending_blocks = set()  # 背景正在算、還沒放回共用儲存的塊
+_blocks_lock = threading.Lock()
+_block_writer = None
+
+
+def _keep_block(block, entries):
+    with _blocks_lock:
+        _blocks[block] = entries
+        _blocks.move_to_end(block)
+        while len(_blocks) > SHARED_BLOCK_CACHE_SIZE:
+            _blocks.popitem(last=False)
+
+
+def _share_block(block, namespace):
+    """背景執行：整塊算好放回共用儲存"""
+    try:
+        entries = _render_block(block)
+        shared_backend().put(namespace, str(block), json.dumps(entries, separators=(",", ":")).encode("utf-8"))
+        _keep_block(block, entries)
+    finally:
+        with _blocks_lock:
+            _pending_blocks.discard(block)
+
+
+def _schedule_block(block, namespace):
+    global _block_writer
+    with _blocks_lock:
+        if block in _pending_blocks:
+            return
+        _pending_blocks.add(block)
+        if _block_writer is None:
+            _block_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="number-words")
+    try:
+        _block_writer.submit(_share_block, block, namespace)
+    except RuntimeError:
+        # 行程正在結束，不再排新的工作
+        with _blocks_lock:
+            _pending_blocks.discard(block)
+
+
+def _shared_entry(number):
+    """
+    共用儲存裡這個數字的 [寫法, [唸法…]]；沒有設定共用儲存、數字超過
+    SHARED_WORDS_LIMIT，或這一塊還沒有人算好時是 None（呼叫端自己算這一個數字）
+    """
+    if not 0 <= number < SHARED_WORDS_LIMIT:
+        return None
+    backend = shared_backend()
+    if backend is None:
+        return None
+    block, offset = divmod(number, SHARED_BLOCK_SIZE)
+    with _blocks_lock:
+        entries = _blocks.get(block)
+        if entries is not None:
+            _blocks.move_to_end(block)
+            return entries[offset]
+        if block in _pending_blocks:
+            return None
+    namespace = f"number_words:{num2words_version()}"
+    cached = backend.get(namespace, str(block))
+    if cached is None:
+        # 整塊要算十幾毫秒，不在腳本執行緒上算：這次先只算這一個數字
+        _schedule_block(block, namespace)
+        return None
+    entries = json.loads(cached)
+    _keep_block(block, entries)
+    return entries[offset]
+
+
+@lru_cache(maxsize=NUMBER_WORD_CACHE_SIZE)
+def get_number_word(number):
+    entry = _shared_entry(number)
+    if entry is not None:
+        return entry[0]
+    return _render_number_word(number)
+
+
+@lru_cache(maxsize=NUMBER_WORD_CACHE_SIZE)
+def number_readings(number):
+    """這個數字所有算對的唸法：get_number_word 的寫法，年份範圍內再加上年份唸法"""
+    entry = _shared_entry(number)
+    if entry is not None:
+        return tuple(entry[1])
+    return tuple(_render_readings(number, get_number_word(number)))
+
+
+def number_vocabulary(start, end):
+    """練習範圍內所有數字會用到的英文單字（給離線辨識當作詞彙表）"""
+    if end - start + 1 > VOCABULARY_SCAN_LIMIT:
+        # 大範圍：一到九百九十九的單字，加上範圍內用得到的 thousand、million、billion
+        vocabulary = number_vocabulary(1, 999)
+        vocabulary.update(word for scale, word in SCALES if scale <= end)
+        if start == 0:
+            vocabulary.add("zero")
+        if start <= YEAR_RANGE[1] and end >= YEAR_RANGE[0]:
+            vocabulary.add("oh")
+        return vocabulary
+
+    vocabulary = set()
+    for number in range(start, end + 1):
+        for reading in number_readings(number):
+            # 超過一千的寫法會有逗號（one thousand, two hundred）
+            vocabulary.update(word.strip(",") for word in reading.split())
+    return vocabulary
@@ -0,0 +1,248 @@
+"""
+對外呼叫（gTTS 語音合成、Google 線上辨識）
+
+全班同時按「聽老師發音」時，每個 session 都各自向 gTTS 要同一個音檔；
+網路偶爾抖一下，辨識就直接變成「錯誤」。這裡是兩者共用的一層：
+
+- 相同的請求還在進行中時不再送第二次（single-flight），大家等同一個結果
+- 每個服務一個 requests.Session，連線池重複使用已經建立好的連線
+- 同時進行的請求數有上限，超過的排隊等待，等太久就放棄
+- 暫時性的錯誤（連線失敗、逾時、429、5xx）以指數退避加隨機抖動重試
+- 連續失敗太多次就斷路（circuit breaker）：冷卻時間內直接失敗，
+  呼叫端改走快取或離線的路徑，不會每個人都再等一次逾時
+
+端點可以用環境變數設定，測試時指向本機的假伺服器
+（見 benchmarks/bench_outbound.py）：
+
+    TTS_ENDPOINT=http://127.0.0.1:8000/tts
+    ASR_ENDPOINT=http://127.0.0.1:8000/recognize
+
+requests 跟著 gTTS 一起裝，但一樣等到第一次真的要連線時才 import。
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class OutboundError(RuntimeError):
+    """對外呼叫失敗（重試之後還是失敗、斷路中或排隊太久）"""
+
+
+class CircuitOpen(OutboundError):
+    """服務連續失敗，斷路冷卻中"""
+
+
+class OutboundBusy(OutboundError):
+    """同時進行的請求已達上限，排隊太久"""
+
+
+def is_transient(error):
+    """值得重試的錯誤：連線失敗、逾時、429 與 5xx"""
+    import requests
+
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class SingleFlight:
+    """同一個 key 同時只執行一次，其他呼叫者等待並拿到同一個結果（或例外）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class CircuitBreaker:
+    """
+    連續 failure_threshold 次失敗就打開（直接拒絕），reset_timeout 秒後
+    半開：只放一個試探請求過去，成功就關閉，失敗就再冷卻一輪
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = "closed"  # closed, open, half_open
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self._clock() - self.opened_at >= self.reset_timeout:
+                # 冷卻結束（或上一個試探請求一直沒有結果）：再放一個試探請求過去
+                self.state = "half_open"
+                self.opened_at = self._clock()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = self._clock()
+
+    def retry_after(self):
+        """斷路中還要冷卻幾秒；沒有斷路時是 0"""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self.opened_at))
+
+
+class OutboundClient:
+    """一個對外服務的連線池、並行上限、重試與斷路"""
+
+    def __init__(self, name, max_concurrency=4, queue_timeout=5.0, retries=2,
+                 backoff=0.2, max_backoff=2.0, failure_threshold=5, reset_timeout=30.0, rng=None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.flights = SingleFlight()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._rng = rng or random.Random()
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counts = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0, "busy": 0}
+
+    @property
+    def session(self):
+        """共用的 requests.Session；連線池大小跟並行上限一樣"""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._counts[name] += 1
+        metrics.inc("outbound", service=self.name, event=name)
+
+    def backoff_delay(self, attempt):
+        """第 attempt 次重試前等待的秒數（full jitter：0 到退避上限之間隨機）"""
+        return self._rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, key, fn, *args, **kwargs):
+        """
+        以 fn(session, *args, **kwargs) 送出請求。key 相同的呼叫同時只會
+        真的送出一次；key 是 None 時不合併
+        """
+        if key is None:
+            return self._call(fn, *args, **kwargs)
+        return self.flights.do(key, self._call, fn, *args, **kwargs)
+
+    def _call(self, fn, *args, **kwargs):
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpen(f"{self.name} 暫時無法連線，{self.breaker.retry_after():.0f} 秒後再試")
+
+        for attempt in range(self.retries + 1):
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                self._count("busy")
+                raise OutboundBusy(f"{self.name} 同時進行的請求太多（{self.max_concurrency}）")
+            try:
+                self._count("attempts")
+                result = fn(self.session, *args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # 服務有回應，只是這次的內容不對（例如辨識不出文字），不算斷路的失敗
+                    self.breaker.record_success()
+                    raise
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._slots.release()
+
+            if attempt < self.retries:
+                self._count("retries")
+                time.sleep(self.backoff_delay(attempt))
+
+        self._count("failures")
+        self.breaker.record_failure()
+        raise OutboundError(f"{self.name} 連線失敗（重試 {self.retries} 次）：{error}") from error
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._counts)
+        stats.update(
+            state=self.breaker.state,
+            trips=self.breaker.trips,
+            retry_after=self.breaker.retry_after(),
+            shared=self.flights.shared,
+            in_flight=self.flights.in_flight(),
+        )
+        return stats
+
+
+# =========================
+# 各服務共用的 client
+# =========================
+TTS_ENDPOINT = os.environ.get("TTS_ENDPOINT", "")
+ASR_ENDPOINT = os.environ.get("ASR_ENDPOINT", "http://www.google.com/speech-api/v2/recognize")
+OUTBOUND_TIMEOUT = float(os.environ.get("OUTBOUND_TIMEOUT", 10))
+
+clients = {
+    "tts": OutboundClient("tts", max_concurrency=int(os.environ.get("TTS_MAX_CONCURRENCY", 4))),
+    "asr": OutboundClient("asr", max_concurrency=int(os.environ.get("ASR_MAX_CONCURRENCY", 8))),
+}
@@ -0,0 +1,109 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+from analytics import daily_pass_rate, hardest_numbers, load_confusions, load_number_stats
+from attempt_log import attempt_log
+
+st.set_page_config(page_title="教師分析", layout="wide")
+
+ANALYTICS_TTL = 30
+
+@st.cache_data(ttl=ANALYTICS_TTL)
+def cached_number_stats(path):
+    return load_number_stats(path)
+
+@st.cache_data(ttl=ANALYTICS_TTL)
+def cached_confusions(path, number=None, limit=20):
+    return load_confusions(path, number=number, limit=limit)
+
+@st.cache_data(ttl=ANALYTICS_TTL)
+def cached_daily_pass_rate(path, days):
+    return daily_pass_rate(path, days=days)
+
+st.title("📊 教師分析")
+st.caption(f"全班的練習紀錄（每 {ANALYTICS_TTL} 秒更新一次）")
+
+stats = cached_number_stats(attempt_log.path)
+if stats["number"].size == 0:
+    st.info("還沒有任何練習紀錄，小朋友練習之後這裡就會出現統計")
+    st.stop()
+
+# =========================
+# 範圍
+# =========================
+lowest, highest = int(stats["number"][0]), int(stats["number"][-1])
+if lowest < highest:
+    start_n, end_n = st.slider("數字範圍", lowest, highest, (lowest, highest))
+else:
+    start_n, end_n = lowest, highest
+in_range = (stats["number"] >= start_n) & (stats["number"] <= end_n)
+view = {name: values[in_range] for name, values in stats.items()}
+
+total_attempts = int(view["attempts"].sum())
+total_passes = int(view["passes"].sum())
+col1, col2, col3 = st.columns(3)
+col1.metric("練習次數", f"{total_attempts:,}")
+col2.metric("整體通過率", f"{total_passes / total_attempts * 100:.0f}%" if total_attempts else "—")
+col3.metric("練習過的數字", f"{view['number'].size} 個")
+
+# =========================
+# 每個數字
+# =========================
+st.subheader("🎯 每個數字的通過率")
+st.bar_chart(
+    pd.DataFrame({"通過率（%）": view["pass_rate"] * 100}, index=view["number"]),
+    y_label="通過率（%）",
+    x_label="數字",
+)
+
+st.subheader("😣 最需要加強的數字")
+min_attempts = st.number_input("至少練習幾次才列入", min_value=1, value=5, step=1)
+hardest = hardest_numbers(view, min_attempts=min_attempts, limit=10)
+if hardest.size == 0:
+    st.info(f"還沒有數字練習滿 {min_attempts} 次")
+else:
+    st.dataframe(
+        pd.DataFrame({
+            "數字": view["number"][hardest],
+            "練習次數": view["attempts"][hardest],
+            "通過率（%）": np.round(view["pass_rate"][hardest] * 100, 1),
+            "平均分數": np.round(view["mean_score"][hardest], 1),
+            "最常聽成": [
+                next((heard for _, heard, _ in cached_confusions(attempt_log.path, int(number), 1)), "")
+                for number in view["number"][hardest]
+            ],
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+# =========================
+# 混淆
+# =========================
+st.subheader("🔀 最常唸錯成什麼")
+practiced = [int(number) for number in view["number"]]
+focus = st.selectbox("數字", ["全部"] + practiced)
+confusions = cached_confusions(attempt_log.path, number=None if focus == "全部" else focus)
+confusions = [row for row in confusions if start_n <= row[0] <= end_n]
+if not confusions:
+    st.info("這個範圍還沒有唸錯的紀錄")
+else:
+    st.dataframe(
+        pd.DataFrame(confusions, columns=["數字", "聽成", "次數"]),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+# =========================
+# 趨勢
+# =========================
+st.subheader("📈 最近的進步")
+days = st.select_slider("天數", options=[7, 14, 30, 90], value=30)
+day_starts, day_attempts, day_pass_rate = cached_daily_pass_rate(attempt_log.path, days)
+trend = pd.DataFrame(
+    {"練習次數": day_attempts, "通過率（%）": day_pass_rate * 100},
+    index=pd.to_datetime(day_starts, unit="s").date,
+)
+col1, col2 = st.columns(2)
+col1.bar_chart(trend["練習次數"])
+col2.line_chart(trend["通過率（%）"])
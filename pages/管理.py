@@ -0,0 +1,86 @@
+import streamlit as st
+import time
+from attempt_log import attempt_log
+from audio_store import audio_store
+from cache_backends import shared_backend
+from outbound import clients
+from sessions import registry
+
+st.set_page_config(page_title="Session 管理", layout="wide")
+
+st.title("🛠️ Session 管理")
+st.caption(
+    f"閒置超過 {registry.idle_ttl / 60:.0f} 分鐘的 session 會被清掉；"
+    f"最多同時保留 {registry.max_sessions} 個 session"
+)
+
+# =========================
+# 總覽
+# =========================
+stats = registry.stats()
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("目前 session", stats["sessions"])
+col2.metric("佔用記憶體", f"{stats['bytes'] / 1024:.0f} KB")
+col3.metric("已清掉的 session", stats["evictions"], f"已關閉 {stats['closed']} 個", delta_color="off")
+col4.metric("已刪除暫存檔", f"{stats['files_removed']} 個", f"{stats['bytes_freed'] / 1024:.0f} KB", delta_color="off")
+
+log_stats = attempt_log.stats()
+st.caption(
+    f"📝 練習紀錄：已寫入 {log_stats['written']} 筆，等待寫入 {log_stats['pending']} 筆，"
+    f"丟棄 {log_stats['dropped']} 筆，錯誤 {log_stats['errors']} 次（`{attempt_log.path}`）"
+)
+
+if audio_store.mounted:
+    store_stats = audio_store.stats()
+    st.caption(
+        f"🎧 老師發音路由：{store_stats['entries']} 個音檔（{store_stats['bytes'] / 1024:.0f} KB），"
+        f"送出 {store_stats['served']} 次，瀏覽器快取命中（304）{store_stats['not_modified']} 次"
+    )
+
+backend = shared_backend()
+if backend is not None:
+    cache_stats = backend.stats()
+    for namespace, counts in sorted(cache_stats["namespaces"].items()):
+        st.caption(
+            f"🗄️ 共用快取（{cache_stats['backend']}）`{namespace}`：命中 {counts['hits']} ／ "
+            f"未命中 {counts['misses']}（{counts['hit_rate'] * 100:.0f}%），錯誤 {counts['errors']} 次"
+        )
+
+STATE_LABELS = {"closed": "🟢 正常", "half_open": "🟡 試探中", "open": "🔴 斷路中"}
+for name, label in (("tts", "🔊 gTTS"), ("asr", "🎤 Google 辨識")):
+    outbound_stats = clients[name].stats()
+    state = STATE_LABELS[outbound_stats["state"]]
+    if outbound_stats["state"] == "open":
+        state += f"（{outbound_stats['retry_after']:.0f} 秒後重試）"
+    st.caption(
+        f"{label}：{state}，請求 {outbound_stats['calls']} 次，合併 {outbound_stats['shared']} 次，"
+        f"重試 {outbound_stats['retries']} 次，失敗 {outbound_stats['failures']} 次，"
+        f"斷路拒絕 {outbound_stats['rejected']} 次"
+    )
+
+if st.button("🧹 立即清理閒置的 session"):
+    evicted = registry.sweep()
+    st.success(f"清掉了 {evicted} 個閒置的 session")
+    stats = registry.stats()
+
+# =========================
+# 每個 session
+# =========================
+sessions = registry.sessions()
+if not sessions:
+    st.info("目前沒有任何 session")
+else:
+    st.dataframe(
+        [
+            {
+                "session": info["session_id"][:8],
+                "開始時間": time.strftime("%H:%M:%S", time.localtime(info["created_at"])),
+                "閒置（秒）": round(info["idle_seconds"]),
+                "佔用（KB）": round(info["bytes"] / 1024, 1),
+                "暫存檔": info["files"],
+            }
+            for info in sessions
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
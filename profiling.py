@@ -0,0 +1,125 @@
+"""
+重跑效能分析
+
+老師回報「按下開始練習後就卡住」時，可以在網址加上 ?profile=1
+（或在側邊欄打開管理開關），之後每次完整重跑 app.py 都會被取樣：
+
+- 背景執行緒每隔幾毫秒透過 sys._current_frames() 讀取腳本執行緒的呼叫堆疊
+- 腳本的最外層 frame 離開堆疊（跑完、st.stop()、st.rerun() 都算）就停止
+- 報告寫到 PROFILE_DIR：.collapsed 是 flame graph 工具可以直接讀的摺疊堆疊，
+  .txt 是依自身耗時排序的前幾名函式
+
+關閉時只多一次查詢參數的判斷，不會建立任何執行緒。
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+DEFAULT_PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "english-number-practice-profiles")
+)
+SAMPLE_INTERVAL = 0.002
+TOP_N = 20
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RerunProfiler(threading.Thread):
+    """取樣指定執行緒，直到 root_code 這個 frame 不在它的堆疊裡為止"""
+
+    def __init__(self, thread_id, root_code, output_dir=DEFAULT_PROFILE_DIR,
+                 interval=SAMPLE_INTERVAL, top_n=TOP_N, on_done=None, tag=""):
+        super().__init__(name="rerun-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top_n = top_n
+        self.on_done = on_done
+        self.tag = tag
+        self.stacks = Counter()
+        self.samples = 0
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            if frame.f_code is self.root_code:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+                return True
+            frame = frame.f_back
+        return False
+
+    def run(self):
+        started = time.perf_counter()
+        while self._sample():
+            time.sleep(self.interval)
+        report = self.write_report(time.perf_counter() - started)
+        if self.on_done is not None:
+            self.on_done(report)
+
+    def top_functions(self):
+        """回傳 [(函式, 自身取樣數, 含子呼叫取樣數)]，依自身取樣數排序"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+        ranked = sorted(total, key=lambda code: (own[code], total[code]), reverse=True)
+        return [(_frame_label(code), own[code], total[code]) for code in ranked[:self.top_n]]
+
+    def write_report(self, seconds):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self.output_dir, f"rerun-{stamp}-{os.getpid()}-{self.thread_id}")
+        collapsed_path = base + ".collapsed"
+        report_path = base + ".txt"
+
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(";".join(_frame_label(code) for code in stack) + f" {count}\n")
+
+        top = self.top_functions()
+        samples = max(self.samples, 1)
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(f"重跑 {self.tag}：{seconds * 1000:.0f} ms，取樣 {self.samples} 次\n\n")
+            f.write(f"{'自身%':>7}{'累計%':>7}  函式\n")
+            for label, own, total in top:
+                f.write(f"{own / samples * 100:>6.1f}%{total / samples * 100:>6.1f}%  {label}\n")
+
+        return {
+            "tag": self.tag,
+            "seconds": seconds,
+            "samples": self.samples,
+            "top": top,
+            "report_path": report_path,
+            "collapsed_path": collapsed_path,
+        }
+
+
+def profile_rerun(reports, tag="", output_dir=DEFAULT_PROFILE_DIR, on_done=None):
+    """
+    從呼叫者（app.py 的最外層）開始取樣這次重跑
+
+    報告完成後會附加到 reports（list 或有上限的 deque，可以放在 session_state 裡），
+    下一次重跑時再顯示出來；on_done 有給的話也會收到同一份報告。
+    """
+    def done(report):
+        reports.append(report)
+        if on_done is not None:
+            on_done(report)
+
+    profiler = RerunProfiler(
+        threading.get_ident(), sys._getframe(1).f_code,
+        output_dir=output_dir, on_done=done, tag=tag,
+    )
+    profiler.start()
+    return profiler
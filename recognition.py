@@ -0,0 +1,119 @@
+"""
+發音辨識與評分流程
+
+process_audio 不使用任何 Streamlit 狀態，可以直接丟到背景工作池執行，
+回傳的 outcome 是一般的 dict。
+"""
+import time
+
+import speech_recognition as sr
+
+from audio_processing import preprocess_recording
+from metrics import metrics
+from recognizers import (
+    audio_data_from_bytes, audio_data_from_pcm, fallback_backend, get_backend, latency_stats
+)
+from scoring import build_reverse_index, lookup_number, score_hypotheses
+
+
+def empty_outcome(backend_name, feedback="error"):
+    return {
+        "feedback": feedback,
+        "score": None,
+        "is_correct": False,
+        "result": None,
+        "backend": backend_name,
+        "latency_ms": None,
+        "alternatives": [],
+        "number": None,
+        "preprocessing": None,
+    }
+
+
+def process_audio(audio_bytes, target_word, score_good, score_ok, tolerance_level,
+                  backend_name="google", vocabulary=None, target_number=None, number_range=None,
+                  preprocess=True):
+    with metrics.timed("process_audio", backend=backend_name) as labels:
+        outcome = _process_audio(
+            audio_bytes, target_word, score_good, score_ok, tolerance_level,
+            backend_name, vocabulary, target_number, number_range, preprocess
+        )
+        labels["feedback"] = outcome["feedback"]
+    metrics.inc("recognition", backend=outcome["backend"], feedback=outcome["feedback"])
+    return outcome
+
+
+def _process_audio(audio_bytes, target_word, score_good, score_ok, tolerance_level,
+                   backend_name, vocabulary, target_number, number_range, preprocess):
+    backend = get_backend(backend_name)
+    reverse_index = build_reverse_index(*number_range) if number_range else None
+    outcome = empty_outcome(backend.name)
+
+    try:
+        # 錄音直接在記憶體中解碼，不再寫入、讀回、刪除暫存檔
+        audio = None
+        if preprocess:
+            try:
+                # 單聲道、16 kHz、去掉前後靜音，送去辨識的資料少很多
+                pcm, sample_rate, outcome["preprocessing"] = preprocess_recording(audio_bytes)
+                audio = audio_data_from_pcm(pcm, sample_rate)
+            except (RuntimeError, ValueError):
+                audio = None
+        if audio is None:
+            audio = audio_data_from_bytes(audio_bytes)
+        started = time.perf_counter()
+        try:
+            try:
+                hypotheses = backend.recognize_alternatives(audio, language="en-US", vocabulary=vocabulary)
+            except sr.RequestError:
+                # 線上辨識連不上（或斷路中）：有離線引擎就改用它，這次錄音不會白錄
+                fallback = fallback_backend(backend)
+                if fallback is None:
+                    raise
+                metrics.inc("recognition_fallbacks", backend=backend.name, fallback=fallback.name)
+                backend = fallback
+                outcome["backend"] = backend.name
+                hypotheses = backend.recognize_alternatives(audio, language="en-US", vocabulary=vocabulary)
+        finally:
+            elapsed = time.perf_counter() - started
+            latency_stats.record(backend.name, elapsed)
+            metrics.observe("recognize", elapsed * 1000, backend=backend.name)
+            outcome["latency_ms"] = elapsed * 1000
+
+        # 小朋友說 thirteen 常被辨識成 thirty，正確答案可能排在第二名，
+        # 所以每個候選都評分，取分數最高的（同分時保留原本的排名）
+        scores = score_hypotheses(
+            target_word, hypotheses, tolerance_level,
+            target_number=target_number, reverse_index=reverse_index
+        )
+        best = max(range(len(hypotheses)), key=lambda i: scores[i])
+        result, score = hypotheses[best], scores[best]
+        outcome["alternatives"] = list(zip(hypotheses, scores))
+        if reverse_index is not None:
+            # 記下小朋友實際說的是哪個數字（例如把 13 說成 30）
+            outcome["number"] = lookup_number(result, reverse_index)
+
+        if score >= score_good:
+            feedback = "correct"
+            is_correct = True
+        elif score >= score_ok:
+            feedback = "close"
+            is_correct = False
+        else:
+            feedback = "retry"
+            is_correct = False
+
+        outcome.update(feedback=feedback, score=score, is_correct=is_correct, result=result)
+        return outcome
+
+    except sr.UnknownValueError:
+        metrics.inc("recognition_errors", backend=backend.name, kind="unknown_value")
+        outcome["feedback"] = "unclear"
+        return outcome
+    except sr.RequestError:
+        metrics.inc("recognition_errors", backend=backend.name, kind="request")
+        return outcome
+    except Exception as e:
+        metrics.inc("recognition_errors", backend=backend.name, kind=type(e).__name__)
+        outcome["result"] = str(e)
+        return outcome
@@ -0,0 +1,229 @@
+"""
+語音辨識引擎
+
+process_audio 透過這裡的介面呼叫辨識引擎，可以在 Google 線上辨識與
+本機離線辨識（Vosk）之間切換。Vosk 是選用套件：
+
+    pip install vosk
+    export VOSK_MODEL_PATH=/path/to/vosk-model-small-en-us-0.15
+
+離線辨識時會把詞彙限制在目前練習範圍內 num2words 會產生的單字，
+小模型在 CPU 上也能很快辨識完。
+
+speech_recognition 只在真的要解碼或辨識時才 import，側邊欄列出引擎、
+檢查能不能用都不需要載入它。
+
+Google 線上辨識透過 outbound 的 "asr" client 送出（連線池、重試、斷路）；
+連不上時 process_audio 會改用 fallback_backend() 的離線引擎。
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+
+from outbound import ASR_ENDPOINT, OutboundError, clients
+
+DEFAULT_BACKEND = os.environ.get("ASR_BACKEND", "google")
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", "")
+VOSK_SAMPLE_RATE = 16000
+# 單次辨識的時間上限（秒）；網路卡住時不會讓背景工作一直佔著執行緒
+RECOGNITION_TIMEOUT = float(os.environ.get("ASR_TIMEOUT", 15))
+# 每次辨識最多保留幾個候選結果（n-best）一起評分
+MAX_ALTERNATIVES = 5
+
+
+# 只用來把音檔讀成 AudioData，不保存任何狀態，可以所有執行緒共用
+_reader = None
+
+
+def audio_data_from_bytes(audio_bytes):
+    """直接從記憶體解碼錄音成 AudioData，不經過暫存檔"""
+    global _reader
+    import speech_recognition as sr
+
+    if _reader is None:
+        _reader = sr.Recognizer()
+    with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
+        return _reader.record(source)
+
+
+def audio_data_from_pcm(pcm, sample_rate):
+    """前處理後的 16-bit 單聲道 PCM 直接包成 AudioData"""
+    import speech_recognition as sr
+
+    return sr.AudioData(pcm, sample_rate, 2)
+
+
+class RecognizerBackend:
+    """
+    辨識引擎介面：recognize() 回傳辨識文字，recognize_alternatives() 回傳
+    依可信度排序的 n-best 候選；失敗時丟出 speech_recognition 的例外
+    """
+
+    name = ""
+    label = ""
+
+    def is_available(self):
+        return True
+
+    def unavailable_reason(self):
+        return ""
+
+    def recognize(self, audio, language="en-US", vocabulary=None):
+        raise NotImplementedError
+
+    def recognize_alternatives(self, audio, language="en-US", vocabulary=None):
+        return [self.recognize(audio, language=language, vocabulary=vocabulary)]
+
+
+def _post_google(session, audio, language):
+    """跟 recognize_google 一樣的請求（FLAC、同樣的參數），改從共用的連線池送出"""
+    from speech_recognition.recognizers.google import OutputParser, create_request_builder
+
+    request = create_request_builder(endpoint=ASR_ENDPOINT, language=language).build(audio)
+    response = session.post(
+        request.full_url, data=request.data, headers=dict(request.header_items()),
+        timeout=RECOGNITION_TIMEOUT,
+    )
+    response.raise_for_status()
+    # show_all=True 會回傳完整的候選清單，同一次請求不需額外網路往返
+    return OutputParser(show_all=True, with_confidence=False).parse(response.text)
+
+
+class GoogleBackend(RecognizerBackend):
+    name = "google"
+    label = "Google（線上）"
+
+    def recognize(self, audio, language="en-US", vocabulary=None):
+        return self.recognize_alternatives(audio, language=language)[0]
+
+    def recognize_alternatives(self, audio, language="en-US", vocabulary=None):
+        import requests
+        import speech_recognition as sr
+
+        # 同一段錄音重複送出（例如連按兩次）時只辨識一次
+        key = ("google", language, hashlib.blake2b(audio.frame_data, digest_size=16).digest())
+        try:
+            response = clients["asr"].call(key, _post_google, audio, language)
+        except (OutboundError, requests.RequestException) as e:
+            raise sr.RequestError(str(e)) from e
+        hypotheses = [
+            alternative["transcript"]
+            for alternative in response.get("alternative", [])
+            if alternative.get("transcript")
+        ]
+        if not hypotheses:
+            raise sr.UnknownValueError()
+        return hypotheses[:MAX_ALTERNATIVES]
+
+
+class VoskBackend(RecognizerBackend):
+    name = "vosk"
+    label = "Vosk（離線）"
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def unavailable_reason(self):
+        try:
+            import vosk  # noqa: F401
+        except ImportError:
+            return "尚未安裝 vosk 套件（pip install vosk）"
+        if not self.model_path or not os.path.isdir(self.model_path):
+            return "找不到 Vosk 模型，請設定 VOSK_MODEL_PATH"
+        return ""
+
+    def is_available(self):
+        return not self.unavailable_reason()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                import vosk
+                vosk.SetLogLevel(-1)
+                self._model = vosk.Model(self.model_path)
+            return self._model
+
+    def recognize(self, audio, language="en-US", vocabulary=None):
+        return self.recognize_alternatives(audio, language=language, vocabulary=vocabulary)[0]
+
+    def recognize_alternatives(self, audio, language="en-US", vocabulary=None):
+        import speech_recognition as sr
+        import vosk
+
+        model = self._get_model()
+        if vocabulary:
+            # 限定詞彙的文法，讓小模型只在數字單字之間做選擇
+            grammar = json.dumps(sorted(vocabulary) + ["[unk]"])
+            recognizer = vosk.KaldiRecognizer(model, VOSK_SAMPLE_RATE, grammar)
+        else:
+            recognizer = vosk.KaldiRecognizer(model, VOSK_SAMPLE_RATE)
+
+        recognizer.SetMaxAlternatives(MAX_ALTERNATIVES)
+
+        raw = audio.get_raw_data(convert_rate=VOSK_SAMPLE_RATE, convert_width=2)
+        recognizer.AcceptWaveform(raw)
+        hypotheses = []
+        for alternative in json.loads(recognizer.FinalResult()).get("alternatives", []):
+            text = " ".join(word for word in alternative.get("text", "").split() if word != "[unk]")
+            if text and text not in hypotheses:
+                hypotheses.append(text)
+        if not hypotheses:
+            raise sr.UnknownValueError()
+        return hypotheses
+
+
+BACKENDS = {
+    GoogleBackend.name: GoogleBackend,
+    VoskBackend.name: VoskBackend,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name):
+    """每個引擎在整個行程只建立一次"""
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def fallback_backend(backend):
+    """線上引擎連不上時改用的離線引擎；沒有可用的就是 None"""
+    if backend.name == VoskBackend.name:
+        return None
+    offline = get_backend(VoskBackend.name)
+    return offline if offline.is_available() else None
+
+
+class LatencyStats:
+    """各辨識引擎的延遲統計，方便比較線上與離線辨識"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, seconds):
+        with self._lock:
+            count, total, last = self._stats.get(name, (0, 0.0, 0.0))
+            self._stats[name] = (count + 1, total + seconds, seconds)
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": count,
+                    "mean_ms": total / count * 1000,
+                    "last_ms": last * 1000,
+                }
+                for name, (count, total, last) in self._stats.items()
+            }
+
+
+latency_stats = LatencyStats()
+
@@ -0,0 +1,223 @@
+"""
+闖關模式的出題順序
+
+每個數字有一個 0～1 的弱點分數：評分越低升得越多、答對就往下降，
+越近的結果影響越大（指數移動平均）。出題時挑優先度最高的數字：
+
+    優先度 = 弱點分數 + STALENESS × 這一輪裡隔了幾題沒出現
+
+第二項對所有數字都以同樣的速度增加，所以比較兩個數字時只需要
+「弱點分數 − STALENESS × 開始等待的題號」，這個值只有在該數字被出題、
+評分，或新的一輪開始時才會改變。出現過的數字放在依這個值排序的堆積裡，並記住每個
+數字在堆積中的位置，更新時直接在原位置上浮或下沉：出題 O(1)、更新 O(log n)。
+
+還沒出現過的數字不必放進堆積：它們依 ShuffledRange 的亂序排隊，範圍到十億
+也只記得種子與游標。排在最前面的新數字當作弱點分數 PRIOR_WEAKNESS、
+從這一輪開始（start_round）就在等待。每一輪開始時，所有數字的等待題數
+都從這一輪算起，所以同一輪裡答對過的數字（弱點分數低於 PRIOR_WEAKNESS）
+一定排在新數字後面；答錯的數字比新數字優先，隔一兩題就會再練一次。
+上一輪答錯的數字在下一輪一開始就會先出。
+"""
+import random
+
+PRIOR_WEAKNESS = 0.5
+RECENT_WEIGHT = 0.5
+STALENESS = 0.1
+
+_MASK64 = (1 << 64) - 1
+_FEISTEL_ROUNDS = 4
+
+
+def _mix(value):
+    """splitmix64 的最後混合步驟，當作 Feistel 的回合函數"""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & _MASK64
+    return value ^ (value >> 31)
+
+
+class ShuffledRange:
+    """
+    start～end 的一個亂序排列，只存種子：第 i 個元素用 Feistel 網路算出來。
+
+    Feistel 網路在 2 的次方大小的範圍內一定是一對一的；超出 end 的值
+    就再排列一次（cycle walking），直到落回範圍內。範圍至少占排列空間
+    的四分之一，平均不到四次就會落回來。
+    """
+
+    def __init__(self, start, end, seed):
+        self.start = start
+        self.end = end
+        self.seed = seed
+        size = end - start + 1
+        self._half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_mask = (1 << self._half_bits) - 1
+        self._round_keys = [_mix(seed + round_number) for round_number in range(_FEISTEL_ROUNDS)]
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    def _permute(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for key in self._round_keys:
+            left, right = right, left ^ (_mix(right + key) & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        value = self._permute(index)
+        while value >= len(self):
+            value = self._permute(value)
+        return self.start + value
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+class WeaknessScheduler:
+    """一位小朋友在某個數字範圍內的弱點分數與出題堆積"""
+
+    def __init__(self, start, end, prior=PRIOR_WEAKNESS, recent_weight=RECENT_WEIGHT,
+                 staleness=STALENESS, rng=None):
+        self._rng = rng or random.Random()
+        self.number_range = (start, end)
+        self.prior = prior
+        self.recent_weight = recent_weight
+        self.staleness = staleness
+        self.step = 0
+        self.weakness = {}
+        self.last_seen = {}
+        # 還沒出現過的數字依這個順序排隊，_cursor 之前的都已經放進堆積了
+        self._unseen = ShuffledRange(start, end, self._rng.getrandbits(64))
+        self._cursor = 0
+        self._round_start = 0
+        # 堆積的每一格是 [排序鍵, 亂數, 數字]；排序鍵是負的優先度（heap 頂端是最小值），
+        # 亂數讓優先度相同的數字不會總是同一個先出
+        self._heap = []
+        self._position = {}
+
+    def __len__(self):
+        return len(self._unseen)
+
+    def __contains__(self, number):
+        return self.number_range[0] <= number <= self.number_range[1]
+
+    def priority(self, number):
+        """目前的優先度（弱點分數加上隔了幾題沒出現）"""
+        if number not in self._position:
+            return self.prior + self.staleness * (self.step - self._round_start)
+        return self.weakness[number] + self.staleness * (self.step - self._waiting_since(number))
+
+    def _waiting_since(self, number):
+        return max(self.last_seen[number], self._round_start)
+
+    def start_round(self):
+        """
+        新的一輪：所有數字的等待題數都從現在算起，上一輪隔了多久不再累積，
+        接下來只依弱點分數排序（重建堆積，只有出現過的數字，O(n)）
+        """
+        self._round_start = self.step
+        for entry in self._heap:
+            entry[0] = self._key(entry[2])
+        self._heap.sort()
+        for index, entry in enumerate(self._heap):
+            self._position[entry[2]] = index
+
+    def _next_unseen(self):
+        """排隊中的下一個新數字；跟讀模式評分過的數字已經在堆積裡，跳過"""
+        while self._cursor < len(self._unseen):
+            number = self._unseen[self._cursor]
+            if number not in self._position:
+                return number
+            self._cursor += 1
+        return None
+
+    def upcoming(self, count):
+        """排隊中接下來的 count 個新數字（給預先準備用，不會改變出題順序）"""
+        numbers = []
+        index = self._cursor
+        while len(numbers) < count and index < len(self._unseen):
+            number = self._unseen[index]
+            if number not in self._position:
+                numbers.append(number)
+            index += 1
+        return numbers
+
+    def _add(self, number):
+        self.weakness[number] = self.prior
+        self.last_seen[number] = self.step
+        self._heap.append([self._key(number), self._rng.random(), number])
+        self._position[number] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def next_number(self, exclude=None):
+        """
+        出下一題：優先度最高的數字；如果剛好是 exclude（通常是上一題）就換成
+        第二高的（一定是頂端的其中一個子節點，或是排隊中的新數字），
+        不讓同一個數字連續出現
+        """
+        candidates = [0] if self._heap else []
+        if self._heap and self._heap[0][2] == exclude:
+            candidates = [child for child in (1, 2) if child < len(self._heap)] or candidates
+        best = min((self._heap[index] for index in candidates), default=None)
+
+        unseen = self._next_unseen()
+        # 排隊中的新數字就像從這一輪開始就在等的一般數字；同分時先出新數字
+        unseen_key = -(self.prior - self.staleness * self._round_start)
+        if unseen is not None and (best is None or best[2] == exclude or unseen_key <= best[0]):
+            self._add(unseen)
+            number = unseen
+        elif best is not None:
+            number = best[2]
+        else:
+            raise IndexError("沒有可以出題的數字")
+        self.step += 1
+        self.last_seen[number] = self.step
+        self._update(number)
+        return number
+
+    def record(self, number, score):
+        """依這次的評分（0～100）更新弱點分數；不在範圍內的數字直接忽略"""
+        if number not in self or score is None:
+            return
+        if number not in self._position:
+            self._add(number)
+        miss = 1.0 - min(max(score, 0.0), 100.0) / 100.0
+        self.weakness[number] += self.recent_weight * (miss - self.weakness[number])
+        self._update(number)
+
+    def _key(self, number):
+        # 負的「弱點分數 − STALENESS × 開始等待的題號」，只有出題、評分與新的一輪時會變
+        return -(self.weakness[number] - self.staleness * self._waiting_since(number))
+
+    def _update(self, number):
+        index = self._position[number]
+        self._heap[index][0] = self._key(number)
+        self._sift_down(self._sift_up(index))
+
+    def _swap(self, a, b):
+        heap = self._heap
+        heap[a], heap[b] = heap[b], heap[a]
+        self._position[heap[a][2]] = a
+        self._position[heap[b][2]] = b
+
+    def _sift_up(self, index):
+        while index > 0:
+            parent = (index - 1) // 2
+            if self._heap[index] >= self._heap[parent]:
+                break
+            self._swap(index, parent)
+            index = parent
+        return index
+
+    def _sift_down(self, index):
+        size = len(self._heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and self._heap[child] < self._heap[smallest]:
+                    smallest = child
+            if smallest == index:
+                return index
+            self._swap(index, smallest)
+            index = smallest
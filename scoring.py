@@ -0,0 +1,367 @@
+"""
+發音評分
+
+兒童常見的發音變體與所有數字單字在 import 時就編譯成一個
+Aho-Corasick 自動機（展開成 DFA），評分時只要掃描辨識結果一次，
+就能知道哪些單字與變體出現在結果裡，不必對每個目標單字 × 變體
+逐一做子字串搜尋。評分規則與分數與原本的 calculate_score 完全相同。
+"""
+import hashlib
+import json
+import re
+import zlib
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from cache_backends import shared_backend
+from metrics import metrics
+from number_words import (
+    NUMBER_WORD_CACHE_SIZE, SCALES, get_number_word, num2words_version, number_readings, number_vocabulary
+)
+
+CHILD_PRONUNCIATION_MAP = {
+    "three": ["tree", "free", "sree"],
+    "thirteen": ["thirty", "thurteen", "firteen"],
+    "thirty": ["thirteen", "thirsty", "turty"],
+    "five": ["fibe", "fife"],
+    "seven": ["seben", "sebun"],
+    "eleven": ["eleben", "levin"],
+    "twelve": ["twelb", "twelf"],
+    "twenty": ["twenny", "twunty"],
+    "fifty": ["fity", "fifthy"],
+    "sixty": ["sickty", "sikty"],
+    "seventy": ["sebenty", "sevunty"],
+    "eighty": ["eity", "eitty"],
+    "ninety": ["ninty", "ninity"],
+}
+
+SCALE_WORDS = ["hundred", "thousand", "million", "billion", "trillion", "and"]
+# 展開成 dict 的範圍上限：1～2000 約兩萬筆、4 MB，lru_cache 留 8 個範圍也才幾十 MB。
+# 更大的範圍用 SpokenNumberIndex，查詢結果相同，一次只多幾微秒
+REVERSE_INDEX_LIMIT = 2000
+# 範圍至少這麼大才放進共用儲存；更小的反查表自己建比讀回來解碼還快
+SHARED_INDEX_MIN_SPAN = 200
+
+_HYPHEN = re.compile(r"[-]")
+_NOT_ALNUM = re.compile(r"[^a-z0-9 ]")
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789 "
+
+
+def normalize_text(text):
+    text = text.lower()
+    text = _HYPHEN.sub(" ", text)
+    text = _NOT_ALNUM.sub("", text)
+    return text.strip()
+
+
+class PatternMatcher:
+    """Aho-Corasick 自動機：一次掃描找出文字中出現的所有樣式（可重疊）"""
+
+    def __init__(self, patterns):
+        self.patterns = frozenset(patterns)
+        goto = [{}]
+        outputs = [set()]
+        for pattern in self.patterns:
+            state = 0
+            for char in pattern:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append(set())
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state].add(pattern)
+
+        # 以 BFS 建立失敗連結，並把失敗狀態的輸出合併進來
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                queue.append(child)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+                outputs[child] |= outputs[fail[child]]
+
+        # 展開成完整的轉移表（DFA），掃描時每個字元只查一次表
+        delta = []
+        for state in range(len(goto)):
+            row = {}
+            for char in _ALPHABET:
+                current = state
+                while current and char not in goto[current]:
+                    current = fail[current]
+                row[char] = goto[current].get(char, 0)
+            delta.append(row)
+
+        self._delta = delta
+        self._outputs = [frozenset(output) for output in outputs]
+
+    def find_all(self, text):
+        """回傳 text 中出現過的所有樣式；text 必須已經過 normalize_text"""
+        delta = self._delta
+        outputs = self._outputs
+        found = set()
+        state = 0
+        for char in text:
+            state = delta[state][char]
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+def _build_matcher():
+    patterns = number_vocabulary(0, 99)
+    patterns.update(SCALE_WORDS)
+    for variants in CHILD_PRONUNCIATION_MAP.values():
+        patterns.update(variants)
+    return PatternMatcher(patterns)
+
+
+MATCHER = _build_matcher()
+_VARIANTS = {word: frozenset(variants) for word, variants in CHILD_PRONUNCIATION_MAP.items()}
+
+
+@lru_cache(maxsize=1024)
+def _prepare_target(target):
+    """目標文字固定是 get_number_word 的結果，正規化與拆字只做一次"""
+    normalized = normalize_text(target)
+    words = tuple(normalized.split())
+    variants = tuple(_VARIANTS.get(word) for word in words)
+    indexed = all(word in MATCHER.patterns for word in words)
+    return normalized, words, variants, indexed
+
+
+@lru_cache(maxsize=8)
+def build_reverse_index(start, end):
+    """
+    正規化後的辨識文字 → (數字, 是否為標準寫法)
+
+    標準寫法包含阿拉伯數字、num2words 的寫法（連字號已正規化成空白）、
+    省略 and 的寫法與年份唸法；兒童發音變體另外收錄，但不會蓋掉任何標準寫法
+    （例如 thirty 一定對應 30，不會因為是 thirteen 的變體而變成 13）。
+    範圍超過 REVERSE_INDEX_LIMIT 時改用 SpokenNumberIndex，查詢結果相同。
+    """
+    if end - start + 1 > REVERSE_INDEX_LIMIT:
+        return SpokenNumberIndex(start, end)
+    backend = shared_backend()
+    if backend is None or end - start + 1 < SHARED_INDEX_MIN_SPAN:
+        return _build_reverse_index(start, end)
+
+    # 1～2000 自己建要約半秒，從共用儲存讀回來解碼只要一小部分
+    namespace = f"reverse_index:{_index_fingerprint()}"
+    key = f"{start}-{end}"
+    data = backend.get(namespace, key)
+    if data is not None:
+        forms, numbers, canonical = json.loads(zlib.decompress(data))
+        return dict(zip(forms, zip(numbers, canonical)))
+    index = _build_reverse_index(start, end)
+    values = list(index.values())
+    backend.put(namespace, key, zlib.compress(json.dumps([
+        list(index), [number for number, _ in values], [is_canonical for _, is_canonical in values]
+    ]).encode("utf-8"), 1))
+    return index
+
+
+@lru_cache(maxsize=1)
+def _index_fingerprint():
+    """反查表的內容取決於發音變體表與 num2words 的版本，任何一個改了就換一組鍵"""
+    rules = json.dumps([sorted(CHILD_PRONUNCIATION_MAP.items()), num2words_version()])
+    return hashlib.sha256(rules.encode("utf-8")).hexdigest()[:16]
+
+
+def _build_reverse_index(start, end):
+    """實際展開 dict 反查表（build_reverse_index 的說明）"""
+    index = {}
+    variant_forms = {}
+    for number in range(start, end + 1):
+        index[str(number)] = (number, True)
+        for word in _normalized_readings(number):
+            index[word] = (number, True)
+
+            words = word.split()
+            for position, target_word in enumerate(words):
+                for variant in CHILD_PRONUNCIATION_MAP.get(target_word, []):
+                    form = " ".join(words[:position] + [variant] + words[position + 1:])
+                    variant_forms.setdefault(form, number)
+
+    for form, number in variant_forms.items():
+        index.setdefault(form, (number, False))
+    return index
+
+
+@lru_cache(maxsize=NUMBER_WORD_CACHE_SIZE)
+def _normalized_readings(number):
+    """正規化後的標準寫法，含省略 and 的寫法（依序、不重複）"""
+    forms = []
+    for reading in number_readings(number):
+        word = normalize_text(reading)
+        for form in (word, " ".join(w for w in word.split() if w != "and")):
+            if form not in forms:
+                forms.append(form)
+    return tuple(forms)
+
+
+_SMALL_NUMBERS = {normalize_text(get_number_word(number)): number for number in range(20)}
+_SMALL_NUMBERS.update({normalize_text(get_number_word(tens)): tens for tens in range(20, 100, 10)})
+_SCALE_VALUES = {word: scale for scale, word in SCALES}
+_VARIANT_TARGETS = {}
+for _word, _variants in CHILD_PRONUNCIATION_MAP.items():
+    for _variant in _variants:
+        _VARIANT_TARGETS.setdefault(_variant, []).append(_word)
+
+
+def _parse_cardinal(words):
+    """把英文數字的單字轉成數字（不檢查文法，呼叫者再用標準寫法確認）；無法解析回傳 None"""
+    total = 0
+    current = 0
+    for word in words:
+        if word == "and":
+            continue
+        if word in _SMALL_NUMBERS:
+            current += _SMALL_NUMBERS[word]
+        elif word == "hundred":
+            current = (current or 1) * 100
+        elif word in _SCALE_VALUES:
+            total += (current or 1) * _SCALE_VALUES[word]
+            current = 0
+        else:
+            return None
+    return total + current if words else None
+
+
+def _candidate_numbers(words):
+    """文字可能代表的數字：一般唸法，以及年份唸法（nineteen oh five → 1905）的每一種切法"""
+    number = _parse_cardinal(words)
+    if number is not None:
+        yield number
+    for split in range(1, len(words)):
+        high = _parse_cardinal(words[:split])
+        low_words = words[split + 1:] if words[split] == "oh" else words[split:]
+        low = _parse_cardinal(low_words)
+        if high is not None and low is not None and 10 <= high <= 99 and low <= 99:
+            yield high * 100 + low
+
+
+class SpokenNumberIndex:
+    """
+    範圍太大、無法事先展開成 dict 時的反查表：直接把辨識文字解析成數字，
+    再用 number_readings 確認是不是標準寫法。和 dict 一樣提供 get()。
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    def _exact(self, text):
+        if text.isdigit():
+            number = int(text)
+            return number if self.start <= number <= self.end and str(number) == text else None
+        for number in _candidate_numbers(text.split()):
+            if self.start <= number <= self.end and text in _normalized_readings(number):
+                return number
+        return None
+
+    def get(self, text, default=None):
+        number = self._exact(text)
+        if number is not None:
+            return number, True
+        # 兒童發音變體：一次換回一個單字，換回來是標準寫法才算
+        words = text.split()
+        for position, word in enumerate(words):
+            for target_word in _VARIANT_TARGETS.get(word, ()):
+                number = self._exact(" ".join(words[:position] + [target_word] + words[position + 1:]))
+                if number is not None:
+                    return number, False
+        return default
+
+
+def lookup_number(result, reverse_index):
+    """把辨識結果直接對應到數字；查不到回傳 None"""
+    number, _ = reverse_index.get(normalize_text(result), (None, False))
+    return number
+
+
+def _count_matches(words, indexed, found, result):
+    if indexed:
+        return sum(1 for word in words if word in found)
+    # 自動機沒有收錄的單字才退回子字串搜尋
+    return sum(1 for word in words if (word in found if word in MATCHER.patterns else word in result))
+
+
+def _score_normalized(prepared, result, tolerance_level, base_score=None,
+                      target_number=None, reverse_index=None):
+    """prepared 來自 _prepare_target；base_score 是事先算好的 fuzz.ratio（批次評分時）"""
+    if reverse_index is not None and target_number is not None:
+        # 辨識結果正好是目標數字的標準寫法（例如 "13" 或 "thirteen"），直接滿分
+        number, exact = reverse_index.get(result, (None, False))
+        if exact and number == target_number:
+            return 100
+
+    target, target_words, target_variants, indexed = prepared
+    found = MATCHER.find_all(result)
+    if base_score is None:
+        base_score = fuzz.ratio(target, result)
+
+    if tolerance_level == "寬鬆":
+        result_words = set(result.split())
+
+        for target_word, variants in zip(target_words, target_variants):
+            if target_word in result_words:
+                return 100
+            if variants is not None and not found.isdisjoint(variants):
+                return 95
+
+        matches = _count_matches(target_words, indexed, found, result)
+        if matches > 0:
+            return 80 + (matches * 5)
+
+        return min(100, base_score + 15)
+
+    elif tolerance_level == "中等":
+        matches = _count_matches(target_words, indexed, found, result)
+        tolerance_bonus = sum(
+            10 for variants in target_variants
+            if variants is not None and not found.isdisjoint(variants)
+        )
+
+        bonus = matches * 10
+        return min(100, base_score + bonus + tolerance_bonus)
+
+    else:
+        matches = _count_matches(target_words, indexed, found, result)
+        bonus = matches * 5
+        return min(100, base_score + bonus)
+
+
+def calculate_score(target, result, tolerance_level="中等", target_number=None, reverse_index=None):
+    with metrics.timed("calculate_score", level=tolerance_level):
+        return _score_normalized(
+            _prepare_target(target), normalize_text(result), tolerance_level,
+            target_number=target_number, reverse_index=reverse_index,
+        )
+
+
+def score_hypotheses(target, hypotheses, tolerance_level="中等", target_number=None, reverse_index=None):
+    """替辨識引擎的 n-best 候選一次評分，分數與逐一呼叫 calculate_score 相同"""
+    if not hypotheses:
+        return []
+    with metrics.timed("calculate_score", level=tolerance_level):
+        prepared = _prepare_target(target)
+        results = [normalize_text(hypothesis) for hypothesis in hypotheses]
+        # 所有候選的 fuzz.ratio 一次用 cdist 算完
+        base_scores = process.cdist(results, [prepared[0]], scorer=fuzz.ratio, dtype=np.float64)[:, 0]
+        return [
+            _score_normalized(
+                prepared, result, tolerance_level, float(base_score),
+                target_number=target_number, reverse_index=reverse_index,
+            )
+            for result, base_score in zip(results, base_scores)
+        ]
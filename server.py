@@ -0,0 +1,10 @@
+"""
+用 st.App 啟動練習程式，多掛上老師發音的快取路由（見 audio_store.py）：
+
+    streamlit run server.py
+"""
+import streamlit as st
+
+from audio_store import audio_routes
+
+app = st.App("app.py", routes=audio_routes())
@@ -0,0 +1,308 @@
+"""
+Session 生命週期管理
+
+Streamlit 只會清掉已經斷線的 session；開著沒關的分頁會一直佔著記憶體，
+直到伺服器重開。每次重跑時 app 都會向 registry 回報自己的 session：
+
+- 記錄最後活動時間，以及 session_state 大約佔用多少位元組
+- 閒置超過 SESSION_IDLE_TTL 秒（預設 30 分鐘），或 session 數超過
+  MAX_SESSIONS 時，最久沒動的 session 會被清掉：取消還在跑的辨識工作、
+  刪除它留下的暫存檔、清空 session_state。分頁之後再有動作就從頭開始。
+- 分頁關掉後，Streamlit 在斷線超過 server.disconnectedSessionTTL 秒時就不再認得
+  這個 session；登記簿也跟著把它拿掉，不再抓著它的 session_state 等到閒置時間到
+- 伺服器啟動時清掉上次留下、已經沒有人用的暫存檔
+
+清理是在其他 session 重跑時順便做的（最多每 SWEEP_INTERVAL 秒一次），
+不需要額外的背景執行緒。
+"""
+import fnmatch
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+from jobs import Job
+
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", 30 * 60))
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 500))
+SWEEP_INTERVAL = 30.0
+
+
+def estimate_size(value, depth=3):
+    """粗略估計物件佔用的位元組（容器往下展開 depth 層）"""
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, depth - 1) + estimate_size(v, depth - 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        size += sum(estimate_size(item, depth - 1) for item in value)
+    return size
+
+
+def streamlit_sessions():
+    """
+    回傳 (判斷 session 是否還連著的函式, 斷線 session 保留秒數)；
+    不是用 streamlit run 跑（例如 AppTest）時沒有 Runtime，回傳 None
+    """
+    import streamlit as st
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return None
+    return Runtime.instance().is_active_session, st.get_option("server.disconnectedSessionTTL")
+
+
+def reap_temp_files(directory, pattern="*", max_age=None):
+    """刪除 directory 裡符合 pattern、超過 max_age 秒沒修改的檔案，回傳 (檔案數, 位元組)"""
+    removed = 0
+    freed = 0
+    now = time.time()
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return removed, freed
+    for entry in entries:
+        if not entry.is_file() or not fnmatch.fnmatch(entry.name, pattern):
+            continue
+        try:
+            stat = entry.stat()
+            if max_age is not None and now - stat.st_mtime < max_age:
+                continue
+            os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += stat.st_size
+    return removed, freed
+
+
+class SessionRecord:
+    def __init__(self, session_id, state):
+        self.session_id = session_id
+        self.state = state
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+        self.bytes = 0
+        self.files = set()
+        self.disconnected_at = None
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_seen
+
+
+class SessionRegistry:
+    """所有 session 的登記簿，依最後活動時間排序（最久沒動的在最前面）"""
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, max_sessions=MAX_SESSIONS, sweep_interval=SWEEP_INTERVAL):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._records = OrderedDict()
+        self._evicted = deque(maxlen=1000)
+        self._last_sweep = time.monotonic()
+        self.evictions = 0
+        self.closed = 0
+        self.files_removed = 0
+        self.bytes_freed = 0
+
+    def touch(self, session_id, state):
+        """
+        這個 session 又有動作了；state 是它的 session_state（需要支援
+        items() 與 del，而且可以跨執行緒操作，見 current_session()）
+
+        回傳這個 session 之前是否因為閒置被清掉過。
+        """
+        footprint = sum(estimate_size(value) for _, value in state.items())
+        with self._lock:
+            record = self._records.pop(session_id, None)
+            if record is None:
+                record = SessionRecord(session_id, state)
+            record.state = state
+            record.last_seen = time.monotonic()
+            record.disconnected_at = None
+            record.bytes = footprint
+            self._records[session_id] = record
+            was_evicted = session_id in self._evicted
+            if was_evicted:
+                self._evicted.remove(session_id)
+            sweep_due = time.monotonic() - self._last_sweep >= self.sweep_interval
+            over_capacity = len(self._records) > self.max_sessions
+        if sweep_due or over_capacity:
+            self.sweep()
+        return was_evicted
+
+    def add_files(self, session_id, *paths):
+        """登記 session 產生的暫存檔，session 被清掉時一起刪除"""
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is not None:
+                record.files.update(paths)
+
+    def reap_orphaned_files(self, max_age=None, partial_max_age=3600):
+        """
+        啟動時清掉上次留下的暫存檔：寫到一半的語音快取檔，以及超過
+        閒置時間、已經沒有 session 認領的效能分析報告
+        """
+        from audio_cache import DEFAULT_CACHE_DIR
+        from profiling import DEFAULT_PROFILE_DIR
+
+        partial = reap_temp_files(DEFAULT_CACHE_DIR, ".tmp-*", max_age=partial_max_age)
+        reports = reap_temp_files(
+            DEFAULT_PROFILE_DIR, "rerun-*", max_age=self.idle_ttl if max_age is None else max_age
+        )
+        removed = partial[0] + reports[0]
+        freed = partial[1] + reports[1]
+        with self._lock:
+            self.files_removed += removed
+            self.bytes_freed += freed
+        return removed, freed
+
+    def forget_closed(self):
+        """
+        拿掉 Streamlit 已經不認得的 session（斷線超過 server.disconnectedSessionTTL，
+        不能再連回來），回傳拿掉幾個；斷線後第一次看到時才開始計時
+        """
+        streamlit = streamlit_sessions()
+        if streamlit is None:
+            return 0
+        is_active, disconnected_ttl = streamlit
+        now = time.monotonic()
+        with self._lock:
+            records = list(self._records.values())
+        closed = []
+        for record in records:
+            if is_active(record.session_id):
+                record.disconnected_at = None
+            elif record.disconnected_at is None:
+                record.disconnected_at = now
+            elif now - record.disconnected_at >= disconnected_ttl:
+                closed.append(record.session_id)
+        with self._lock:
+            # 計時的時候它可能又重跑了（touch 會把 disconnected_at 清掉）
+            records = [
+                self._records.pop(session_id) for session_id in closed
+                if session_id in self._records and self._records[session_id].disconnected_at is not None
+            ]
+            self.closed += len(records)
+        for record in records:
+            self._release(record)
+        return len(records)
+
+    def sweep(self):
+        """清掉已經關掉與閒置太久的 session；數量超過上限時從最久沒動的開始清，回傳清掉幾個閒置的"""
+        self.forget_closed()
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            victims = []
+            for session_id, record in self._records.items():
+                over_capacity = len(self._records) - len(victims) > self.max_sessions
+                if record.idle_seconds() >= self.idle_ttl or over_capacity:
+                    victims.append(session_id)
+                else:
+                    break
+            records = [self._records.pop(session_id) for session_id in victims]
+            self._evicted.extend(victims)
+        for record in records:
+            self._release(record)
+        with self._lock:
+            self.evictions += len(records)
+        return len(records)
+
+    def evict(self, session_id):
+        with self._lock:
+            record = self._records.pop(session_id, None)
+            if record is None:
+                return False
+            self._evicted.append(session_id)
+            self.evictions += 1
+        self._release(record)
+        return True
+
+    def _release(self, record):
+        for key, value in list(record.state.items()):
+            # 背景工作可能直接存著，也可能是 {鍵: Job}（例如預先合成的老師發音）
+            for job in value.values() if isinstance(value, dict) else (value,):
+                if isinstance(job, Job):
+                    job.cancel()
+            try:
+                del record.state[key]
+            except KeyError:
+                continue
+        removed = 0
+        freed = 0
+        for path in record.files:
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        with self._lock:
+            self.files_removed += removed
+            self.bytes_freed += freed
+
+    def stats(self):
+        self.forget_closed()
+        with self._lock:
+            return {
+                "sessions": len(self._records),
+                "bytes": sum(record.bytes for record in self._records.values()),
+                "files": sum(len(record.files) for record in self._records.values()),
+                "evictions": self.evictions,
+                "closed": self.closed,
+                "files_removed": self.files_removed,
+                "bytes_freed": self.bytes_freed,
+            }
+
+    def sessions(self):
+        """目前所有 session 的摘要，最近有動作的排前面"""
+        self.forget_closed()
+        with self._lock:
+            return [
+                {
+                    "session_id": record.session_id,
+                    "idle_seconds": record.idle_seconds(),
+                    "bytes": record.bytes,
+                    "files": len(record.files),
+                    "created_at": record.created_at,
+                }
+                for record in reversed(self._records.values())
+            ]
+
+
+class SessionStateView:
+    """
+    某個 session 的 session_state；Streamlit 的 SafeSessionState 每次存取都會上鎖，
+    所以其他 session 的腳本執行緒清理它時也是安全的
+    """
+
+    def __init__(self, safe_state):
+        self._state = safe_state
+
+    def items(self):
+        """使用者的值；綁定在元件上的 key 不算，刪掉的話前端送回來的元件狀態會對不上"""
+        state = self._state.filtered_state
+        for key in self._widget_keys():
+            state.pop(key, None)
+        return state.items()
+
+    def _widget_keys(self):
+        mapper = getattr(getattr(self._state, "_state", None), "_key_id_mapper", None)
+        return list(mapper.id_key_mapping.values()) if mapper is not None else []
+
+    def __delitem__(self, key):
+        del self._state[key]
+
+
+def current_session():
+    """目前這次重跑的 (session_id, SessionStateView)"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id, SessionStateView(ctx.session_state)
+
+
+registry = SessionRegistry()
@@ -0,0 +1,41 @@
+"""
+TTS 語音合成引擎
+
+gTTS（連同 requests）載入要幾十毫秒，大部分音檔都從快取或音檔包拿，
+所以只在真的要合成時才 import。
+
+請求透過 outbound 的 "tts" client 送出：同一個字同時只合成一次、
+共用連線池，失敗時重試，連續失敗會斷路（丟出 OutboundError）。
+"""
+import base64
+import io
+import re
+
+from outbound import OUTBOUND_TIMEOUT, TTS_ENDPOINT, OutboundError, clients
+
+# gTTS 回應裡的音檔（base64），跟 gTTS.stream() 用的是同一個格式
+_AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+
+def _fetch_gtts(session, word, lang):
+    from gtts import gTTS
+
+    tts = gTTS(text=word, lang=lang)
+    buffer = io.BytesIO()
+    # gTTS.write_to_fp 每次都開新的 requests.Session，這裡只借用它組好的請求，
+    # 改從共用的連線池送出
+    for prepared in tts._prepare_requests():
+        if TTS_ENDPOINT:
+            prepared.url = TTS_ENDPOINT
+        response = session.send(prepared, timeout=OUTBOUND_TIMEOUT)
+        response.raise_for_status()
+        match = _AUDIO_PATTERN.search(response.text)
+        if match is None:
+            raise OutboundError("gTTS 的回應裡沒有音檔")
+        buffer.write(base64.b64decode(match.group(1)))
+    return buffer.getvalue()
+
+
+def render_gtts(word, lang="en"):
+    """呼叫 gTTS 合成語音，回傳 mp3 位元組"""
+    return clients["tts"].call(("gtts", word, lang), _fetch_gtts, word, lang)
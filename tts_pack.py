@@ -0,0 +1,155 @@
+"""
+離線 TTS 預錄音檔包
+
+把一段數字範圍的老師發音預先合成，打包成單一檔案：
+
+    MAGIC | 標頭長度 (uint32, little endian) | JSON 標頭 | 音檔資料
+
+JSON 標頭記錄每個數字的文字、在資料區的 offset 與長度。
+App 啟動時以 mmap 開啟，播放時直接從映射的記憶體切出音檔，
+不需要網路也不會寫入磁碟。
+
+建立音檔包：
+
+    python tts_pack.py --start 1 --end 100 --output tts_pack.bin
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"ENPTTS1\n"
+HEADER_LENGTH = struct.Struct("<I")
+DEFAULT_PACK_PATH = os.environ.get(
+    "TTS_PACK_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_pack.bin"),
+)
+
+
+class TTSPack:
+    """以 mmap 開啟的唯讀預錄音檔包"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"不是 TTS 音檔包：{path}")
+
+        start = len(MAGIC)
+        (header_size,) = HEADER_LENGTH.unpack_from(self._mmap, start)
+        start += HEADER_LENGTH.size
+        header = json.loads(self._mmap[start:start + header_size].decode("utf-8"))
+
+        self.lang = header["lang"]
+        self.engine = header["engine"]
+        self._data_start = start + header_size
+        self._entries = {
+            int(number): (entry["text"], entry["offset"], entry["length"])
+            for number, entry in header["entries"].items()
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, number):
+        return number in self._entries
+
+    def _entry(self, number, text, lang, engine):
+        entry = self._entries.get(number)
+        if entry is None or lang != self.lang or engine != self.engine:
+            return None
+        if text is not None and text != entry[0]:
+            return None
+        return entry
+
+    def has(self, number, text=None, lang="en", engine="gtts"):
+        """跟 get 一樣的檢查，但不從 mmap 複製音檔（預先合成用來跳過已經有的）"""
+        return self._entry(number, text, lang, engine) is not None
+
+    def get(self, number, text=None, lang="en", engine="gtts"):
+        """回傳該數字的 mp3 位元組；沒有收錄或內容不符時回傳 None"""
+        entry = self._entry(number, text, lang, engine)
+        if entry is None:
+            return None
+        _, offset, length = entry
+        start = self._data_start + offset
+        return self._mmap[start:start + length]
+
+    def close(self):
+        self._mmap.close()
+
+
+def load_pack(path=DEFAULT_PACK_PATH):
+    """音檔包存在就開啟，不存在則回傳 None"""
+    if not os.path.exists(path):
+        return None
+    return TTSPack(path)
+
+
+def build_pack(numbers, output, render, word_for, lang="en", engine="gtts"):
+    """依序合成每個數字並寫成一個音檔包"""
+    entries = {}
+    chunks = []
+    offset = 0
+    for number in numbers:
+        text = word_for(number)
+        data = render(text)
+        entries[str(number)] = {"text": text, "offset": offset, "length": len(data)}
+        chunks.append(data)
+        offset += len(data)
+
+    header = json.dumps(
+        {"lang": lang, "engine": engine, "entries": entries},
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for data in chunks:
+            f.write(data)
+    os.replace(tmp_path, output)
+    return len(entries), offset
+
+
+def main(argv=None):
+    from audio_cache import AudioCache
+    from number_words import get_number_word
+    from tts_engine import render_gtts
+
+    parser = argparse.ArgumentParser(description="預先合成數字發音並打包成 TTS 音檔包")
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--end", type=int, default=100)
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--output", default=DEFAULT_PACK_PATH)
+    args = parser.parse_args(argv)
+
+    if args.start > args.end:
+        parser.error("--start 不能大於 --end")
+
+    # 透過共用快取合成，已經合成過的數字不必再打一次 gTTS
+    cache = AudioCache()
+
+    def render(text):
+        return cache.get_or_create(text, args.lang, "gtts", lambda: render_gtts(text, args.lang))
+
+    count, size = build_pack(
+        range(args.start, args.end + 1),
+        args.output,
+        render,
+        get_number_word,
+        lang=args.lang,
+    )
+    print(f"已寫入 {count} 個數字（{size / 1024:.0f} KB）到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())